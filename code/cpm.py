@@ -1,8 +1,215 @@
 from enum import Enum
 import numpy as np
-from collections import defaultdict
+from collections import defaultdict, deque
 import heapq
 
+from npu import NPUState, SPARSE_DELIVERY_FRACTION, PARALLEL_MIN_SIZE
+from jit import njit, prange, NUMBA_AVAILABLE
+from gpu import cupy, check_device
+
+# Default NPU parameters (see NeuralProcessingUnit)
+RESTING_POTENTIAL = -70.0
+RESET_POTENTIAL = -75.0
+BASE_THRESHOLD = -55.0
+MEMBRANE_TIME_CONSTANT = 10.0
+REFRACTORY_PERIOD = 2.0
+
+# Number of recent time steps averaged by get_activity_level
+ACTIVITY_WINDOW = 10
+
+# Number of recent time steps kept in output_history
+OUTPUT_HISTORY_LENGTH = 1000
+
+# Modules whose layers are all at most this size get a forward kernel
+# compiled for their exact shape
+SPECIALIZE_MAX_SIZE = 64
+
+# Integer NPU state codes used inside the array kernels
+_RESTING = NPUState.RESTING.value
+_INTEGRATION = NPUState.INTEGRATION.value
+_REFRACTORY = NPUState.REFRACTORY.value
+
+@njit(cache=True, fastmath=True)
+def _lif_neuron(i, input_current, v, threshold, tau_m, refractory_period,
+                refractory_timer, state, time_step):
+    """
+    Compiled LIF update of NPU i; same semantics as _update_layer.
+    
+    Written with conditional selects instead of early returns so the
+    compiler can emit branch-free code for the unpredictable state checks.
+    """
+    # Refractory countdown; an NPU integrates again once its timer runs out
+    was_refractory = state[i] == _REFRACTORY
+    timer = refractory_timer[i] - time_step if was_refractory else refractory_timer[i]
+    integrating = (not was_refractory) or timer <= 0
+    
+    # Leaky integration, held while refractory
+    dv = (RESTING_POTENTIAL - v[i]) / tau_m[i] * time_step + input_current
+    potential = v[i] + dv if integrating else v[i]
+    
+    # Threshold crossing: reset and (re-)enter the refractory period
+    fired = integrating and potential >= threshold[i]
+    v[i] = RESET_POTENTIAL if fired else potential
+    refractory_timer[i] = refractory_period[i] if fired else max(timer, 0.0)
+    quiet_state = _INTEGRATION if input_current > 0 else _RESTING
+    state[i] = _REFRACTORY if (fired or not integrating) else quiet_state
+    return fired
+
+@njit(inline='always', fastmath=True)
+def _forward_pass(n_input, n_hidden, n_output, v, threshold, tau_m, refractory_period,
+                  refractory_timer, state, fired, input_current, w_ih, s_ih, w_ho, s_ho,
+                  w_rec, s_rec, recurrent_sum, input_sum, hidden_sum, time_step):
+    """
+    Fused input -> hidden -> output pass over a module's concatenated NPU arrays.
+    
+    Layer currents are accumulated in the caller's scratch buffers instead of
+    being materialized between separate passes, and each weight matrix's
+    column scale (ones unless quantized) is applied once per target NPU. On
+    entry, fired still holds the previous step's spikes, which feed the
+    recurrent hidden weights. Inlined into its callers, so layer sizes that
+    are compile-time constants there become loop bounds known to LLVM.
+    
+    Returns the number of non-resting NPUs, counted as states are written
+    rather than in a second pass over the state array.
+    """
+    active = 0
+    hidden_start = n_input
+    output_start = n_input + n_hidden
+    recurrent_sum[:] = 0.0
+    input_sum[:] = 0.0
+    hidden_sum[:] = 0.0
+    
+    # Recurrent input from hidden NPUs that fired last step
+    for i in range(w_rec.shape[0]):
+        if fired[hidden_start + i]:
+            for j in range(n_hidden):
+                recurrent_sum[j] += w_rec[i, j]
+    
+    # Input layer, feeding its spikes forward as they occur
+    for i in range(n_input):
+        fired[i] = _lif_neuron(i, input_current[i], v, threshold, tau_m, refractory_period,
+                               refractory_timer, state, time_step)
+        active += state[i] != _RESTING
+        if fired[i]:
+            for j in range(n_hidden):
+                input_sum[j] += w_ih[i, j]
+    
+    # Hidden layer
+    for j in range(n_hidden):
+        k = hidden_start + j
+        hidden_current = input_sum[j] * s_ih[j]
+        if w_rec.shape[0]:
+            hidden_current += recurrent_sum[j] * s_rec[j]
+        fired[k] = _lif_neuron(k, hidden_current, v, threshold, tau_m, refractory_period,
+                               refractory_timer, state, time_step)
+        active += state[k] != _RESTING
+        if fired[k]:
+            for m in range(n_output):
+                hidden_sum[m] += w_ho[j, m]
+    
+    # Output layer
+    for m in range(n_output):
+        k = output_start + m
+        fired[k] = _lif_neuron(k, hidden_sum[m] * s_ho[m], v, threshold, tau_m,
+                               refractory_period, refractory_timer, state, time_step)
+        active += state[k] != _RESTING
+    return active
+
+@njit(cache=True, fastmath=True, nogil=True)
+def _forward_cpm(v, threshold, tau_m, refractory_period, refractory_timer, state, fired,
+                 input_current, w_ih, s_ih, w_ho, s_ho, w_rec, s_rec,
+                 recurrent_sum, input_sum, hidden_sum, time_step):
+    """Generic fused forward pass; layer sizes are read from the weight shapes."""
+    n_input, n_hidden = w_ih.shape
+    return _forward_pass(n_input, n_hidden, w_ho.shape[1], v, threshold, tau_m, refractory_period,
+                         refractory_timer, state, fired, input_current, w_ih, s_ih, w_ho, s_ho,
+                         w_rec, s_rec, recurrent_sum, input_sum, hidden_sum, time_step)
+
+# Forward kernels specialized on (input_size, hidden_size, output_size)
+_FORWARD_KERNELS = {}
+
+def _make_forward_kernel(n_input, n_hidden, n_output):
+    """
+    Get a fused forward kernel compiled for one fixed module shape.
+    
+    The sizes are closure constants, so Numba compiles them into the kernel
+    and LLVM can fully unroll the small layer loops. Kernels are cached per
+    shape since every module of that shape can share one.
+    """
+    key = (n_input, n_hidden, n_output)
+    kernel = _FORWARD_KERNELS.get(key)
+    if kernel is None:
+        @njit(fastmath=True, nogil=True)
+        def kernel(v, threshold, tau_m, refractory_period, refractory_timer, state, fired,
+                   input_current, w_ih, s_ih, w_ho, s_ho, w_rec, s_rec,
+                   recurrent_sum, input_sum, hidden_sum, time_step):
+            return _forward_pass(n_input, n_hidden, n_output, v, threshold, tau_m, refractory_period,
+                                 refractory_timer, state, fired, input_current, w_ih, s_ih, w_ho, s_ho,
+                                 w_rec, s_rec, recurrent_sum, input_sum, hidden_sum, time_step)
+        _FORWARD_KERNELS[key] = kernel
+    return kernel
+
+def _layer_trajectory(v, threshold, tau_m, refractory_period, refractory_timer, state,
+                      prev_fired, currents, w_rec, s_rec, recurrent_sum, time_step,
+                      fired_out, active_out):
+    """
+    Run one layer for currents.shape[0] consecutive time steps.
+    
+    currents holds the feed-forward input of every step; recurrent input is
+    added from prev_fired, which is updated in place after each step. The
+    NPU updates within a step are independent and run under prange.
+    """
+    n = v.shape[0]
+    for t in range(currents.shape[0]):
+        recurrent_sum[:] = 0.0
+        for i in range(w_rec.shape[0]):
+            if prev_fired[i]:
+                for j in range(n):
+                    recurrent_sum[j] += w_rec[i, j]
+        
+        active = 0
+        for i in prange(n):
+            current = currents[t, i]
+            if w_rec.shape[0]:
+                current += recurrent_sum[i] * s_rec[i]
+            fired_out[t, i] = _lif_neuron(i, current, v, threshold, tau_m, refractory_period,
+                                          refractory_timer, state, time_step)
+            if state[i] != _RESTING:
+                active += 1
+        active_out[t] = active
+        prev_fired[:] = fired_out[t]
+
+_serial_layer_trajectory = njit(cache=True, fastmath=True, nogil=True)(_layer_trajectory)
+_parallel_layer_trajectory = njit(cache=True, fastmath=True, nogil=True, parallel=True)(_layer_trajectory)
+
+def quantize_weights(weights):
+    """
+    Quantize a [pre, post] weight matrix to int8 with one scale per column.
+    
+    Returns:
+        Tuple of (int8 weights, float32 scale) such that weights ~= q * scale
+    """
+    max_abs = np.abs(weights).max(axis=0) if weights.shape[0] else np.zeros(weights.shape[1])
+    scale = np.where(max_abs > 0, max_abs / 127.0, 1.0).astype(np.float32)
+    return np.round(weights / scale).astype(np.int8), scale
+
+def compute_all_activities(cpms):
+    """
+    Get the activity level of several CPMs at once.
+    
+    Equivalent to calling get_activity_level on each CPM, but divides the
+    windowed activity sums of all CPMs in one array operation.
+    
+    Args:
+        cpms: Sequence of CorticalProcessingModules
+        
+    Returns:
+        Float array of activity levels, in the order of cpms
+    """
+    sums = np.fromiter((cpm._activity_sum for cpm in cpms), dtype=np.float64, count=len(cpms))
+    counts = np.fromiter((len(cpm.activity_history) for cpm in cpms), dtype=np.float64, count=len(cpms))
+    return np.divide(sums, counts, out=np.zeros(len(cpms)), where=counts > 0)
+
 class CPMType(Enum):
     SENSORY = 0
     TEMPORAL = 1
@@ -17,7 +224,7 @@ class CorticalProcessingModule:
     specialized functional unit for specific types of information processing.
     """
     
-    def __init__(self, id, cpm_type, input_size, hidden_size, output_size):
+    def __init__(self, id, cpm_type, input_size, hidden_size, output_size, quantize=False, device='cpu', seed=None):
         """
         Initialize a Cortical Processing Module with configurable parameters.
         
@@ -27,85 +234,198 @@ class CorticalProcessingModule:
             input_size: Number of input NPUs
             hidden_size: Number of hidden layer NPUs
             output_size: Number of output NPUs
+            quantize: Propagate spikes through int8-quantized weights
+            device: 'cpu', or 'cuda' to run the feed-forward matrix products
+                of process_batch on the GPU (requires CuPy)
+            seed: Seed for this module's weight initialization (None for fresh entropy)
         """
+        check_device(device)
         self.id = id
         self.cpm_type = cpm_type
         self.input_size = input_size
         self.hidden_size = hidden_size
         self.output_size = output_size
+        self.quantize = quantize
+        self.device = device
+        self.rng = np.random.default_rng(seed)  # Per-module random stream
         
-        # Initialize NPUs for each layer
-        from npu import NeuralProcessingUnit
-        
-        # Input layer NPUs
-        self.input_npus = {}
-        for i in range(input_size):
-            npu_id = f"{id}_input_{i}"
-            self.input_npus[npu_id] = NeuralProcessingUnit(npu_id)
-        
-        # Hidden layer NPUs
-        self.hidden_npus = {}
-        for i in range(hidden_size):
-            npu_id = f"{id}_hidden_{i}"
-            self.hidden_npus[npu_id] = NeuralProcessingUnit(npu_id)
-        
-        # Output layer NPUs
-        self.output_npus = {}
-        for i in range(output_size):
-            npu_id = f"{id}_output_{i}"
-            self.output_npus[npu_id] = NeuralProcessingUnit(npu_id)
+        # Structure-of-arrays NPU state: one contiguous array per field spanning
+        # all layers, with each layer exposed as a view into it
+        hidden_start = input_size
+        output_start = input_size + hidden_size
+        self._all_npus = self._create_layer(output_start + output_size)
+        self._layer_slices = {
+            'input': slice(0, hidden_start),
+            'hidden': slice(hidden_start, output_start),
+            'output': slice(output_start, output_start + output_size)
+        }
+        self.layers = {
+            name: {field: values[layer_slice] for field, values in self._all_npus.items()}
+            for name, layer_slice in self._layer_slices.items()
+        }
         
         # Connect layers with initial random weights
+        self.w_rec = None  # Recurrent hidden weights (temporal/memory modules only)
         self._connect_layers()
         
         # Module state
         self.active = True
         self.local_modulation = 1.0  # Modulation factor for local activity
         
-        # Activity tracking
-        self.activity_history = []
-        self.output_history = []
+        # Activity tracking (bounded window with a running sum)
+        self.activity_history = deque(maxlen=ACTIVITY_WINDOW)
+        self._activity_sum = 0
+        self.output_history = deque(maxlen=OUTPUT_HISTORY_LENGTH)
         
         # Configuration parameters based on CPM type
         self._configure_for_type()
+        
+        # Weights are frozen after construction, so prepare the propagation copies once
+        self._prepare_weights()
+        
+        # GPU copies of the feed-forward weights for batched propagation
+        self._device_weights = None
+        if device == 'cuda':
+            w_ih, _, w_ho, _, _, _ = self._propagation_weights
+            self._device_weights = (cupy.asarray(w_ih, dtype=cupy.float32),
+                                    cupy.asarray(w_ho, dtype=cupy.float32))
+        
+        # Scratch buffers reused by every process_input call
+        self._input_current = np.zeros(input_size, dtype=np.float32)
+        self._recurrent_sum = np.zeros(hidden_size, dtype=np.float32)
+        self._input_sum = np.zeros(hidden_size, dtype=np.float32)
+        self._hidden_sum = np.zeros(output_size, dtype=np.float32)
+        
+        # Small fixed-shape modules use a shape-specialized compiled kernel
+        self._forward_kernel = _forward_cpm
+        if NUMBA_AVAILABLE and max(input_size, hidden_size, output_size) <= SPECIALIZE_MAX_SIZE:
+            self._forward_kernel = _make_forward_kernel(input_size, hidden_size, output_size)
+    
+    def _create_layer(self, size):
+        """Allocate the per-field state arrays for one layer of NPUs."""
+        return {
+            'v': np.full(size, RESTING_POTENTIAL, dtype=np.float32),
+            'threshold': np.full(size, BASE_THRESHOLD, dtype=np.float32),
+            'tau_m': np.full(size, MEMBRANE_TIME_CONSTANT, dtype=np.float32),
+            'refractory_period': np.full(size, REFRACTORY_PERIOD, dtype=np.float32),
+            'refractory_timer': np.zeros(size, dtype=np.float32),
+            'state': np.full(size, _RESTING, dtype=np.uint8),
+            'fired': np.zeros(size, dtype=np.bool_)
+        }
     
     def _connect_layers(self):
         """Connect NPUs between layers with initial random weights."""
-        # Connect input to hidden layer
-        for input_id, input_npu in self.input_npus.items():
-            for hidden_id, hidden_npu in self.hidden_npus.items():
-                weight = np.random.uniform(0.1, 0.5)
-                input_npu.add_synapse(hidden_id, weight)
-        
-        # Connect hidden to output layer
-        for hidden_id, hidden_npu in self.hidden_npus.items():
-            for output_id, output_npu in self.output_npus.items():
-                weight = np.random.uniform(0.1, 0.5)
-                hidden_npu.add_synapse(output_id, weight)
+        # weights[pre, post] replaces the per-NPU synapse dicts
+        self.w_ih = self._random_weights(0.1, 0.5, (self.input_size, self.hidden_size))
+        self.w_ho = self._random_weights(0.1, 0.5, (self.hidden_size, self.output_size))
+    
+    def _random_weights(self, low, high, shape):
+        """Draw a float32 weight matrix uniformly from [low, high) using the module's RNG."""
+        weights = self.rng.random(shape, dtype=np.float32)
+        weights *= high - low
+        weights += low
+        return weights
     
     def _configure_for_type(self):
         """Configure module parameters based on CPM type."""
         if self.cpm_type == CPMType.SENSORY:
             # Sensory modules have faster response times
-            for npu in list(self.input_npus.values()) + list(self.hidden_npus.values()) + list(self.output_npus.values()):
-                npu.membrane_time_constant = 5.0
-                npu.refractory_period = 1.0
+            self._all_npus['tau_m'][:] = 5.0
+            self._all_npus['refractory_period'][:] = 1.0
         
         elif self.cpm_type == CPMType.TEMPORAL:
             # Temporal modules have recurrent connections
-            for i, hidden_id in enumerate(self.hidden_npus):
-                for j, target_id in enumerate(self.hidden_npus):
-                    if i != j:  # No self-connections
-                        weight = np.random.uniform(0.05, 0.2)
-                        self.hidden_npus[hidden_id].add_synapse(target_id, weight)
+            self._connect_recurrent(0.05, 0.2)
         
         elif self.cpm_type == CPMType.MEMORY:
             # Memory modules have stronger recurrent connections
-            for i, hidden_id in enumerate(self.hidden_npus):
-                for j, target_id in enumerate(self.hidden_npus):
-                    if i != j:  # No self-connections
-                        weight = np.random.uniform(0.3, 0.6)
-                        self.hidden_npus[hidden_id].add_synapse(target_id, weight)
+            self._connect_recurrent(0.3, 0.6)
+    
+    def _connect_recurrent(self, low, high):
+        """Fully connect the hidden layer to itself with weights in [low, high)."""
+        self.w_rec = self._random_weights(low, high, (self.hidden_size, self.hidden_size))
+        np.fill_diagonal(self.w_rec, 0.0)  # No self-connections
+    
+    def _prepare_weights(self):
+        """Build the (weights, column scale) pairs used for spike propagation."""
+        # Empty stand-in so the fused kernel always receives a recurrent matrix
+        w_rec = self.w_rec if self.w_rec is not None else np.zeros((0, self.hidden_size), dtype=np.float32)
+        
+        self._propagation_weights = []
+        for weights in (self.w_ih, self.w_ho, w_rec):
+            if self.quantize:
+                self._propagation_weights.extend(quantize_weights(weights))
+            else:
+                self._propagation_weights.extend((weights, np.ones(weights.shape[1], dtype=np.float32)))
+    
+    @staticmethod
+    def _propagate(fired, weights, scale):
+        """Summed, scaled current delivered by the fired presynaptic NPUs."""
+        fired_idx = np.flatnonzero(fired)
+        if weights.dtype == np.int8:
+            return weights[fired_idx].sum(axis=0, dtype=np.int32) * scale
+        if len(fired_idx) <= SPARSE_DELIVERY_FRACTION * len(fired):
+            # Few spikes: gather only the weight rows of NPUs that fired
+            return weights[fired_idx].sum(axis=0, dtype=np.float32) * scale
+        return (fired.astype(np.float32) @ weights) * scale
+    
+    def _update_layer(self, layer, input_current, time_step):
+        """
+        Advance every NPU of a layer by one time step.
+        
+        Args:
+            layer: Layer state dictionary (see _create_layer)
+            input_current: Array with the summed input current of each NPU
+            time_step: Duration of time step (ms)
+            
+        Returns:
+            Boolean array marking the NPUs that fired
+        """
+        v = layer['v']
+        state = layer['state']
+        timer = layer['refractory_timer']
+        
+        # Refractory countdown; an NPU integrates again once its timer runs out
+        was_refractory = state == _REFRACTORY
+        np.subtract(timer, time_step, out=timer, where=was_refractory)
+        integrating = ~was_refractory | (timer <= 0)
+        np.maximum(timer, 0.0, out=timer)
+        
+        # Leaky integration, masked so refractory NPUs hold their potential
+        dv = (RESTING_POTENTIAL - v) / layer['tau_m'] * time_step + input_current
+        np.add(v, dv, out=v, where=integrating)
+        
+        # Threshold crossing: reset and (re-)enter the refractory period
+        fired = integrating & (v >= layer['threshold'])
+        np.copyto(v, RESET_POTENTIAL, where=fired)
+        np.copyto(timer, layer['refractory_period'], where=fired)
+        
+        # Non-firing NPUs are integrating if they received input, resting otherwise
+        state[:] = np.where(fired | ~integrating, _REFRACTORY,
+                            np.where(input_current > 0, _INTEGRATION, _RESTING))
+        
+        layer['fired'][:] = fired
+        return fired
+    
+    def _forward_layers(self, input_current, time_step):
+        """NumPy input -> hidden -> output pass, used when Numba is unavailable."""
+        w_ih, s_ih, w_ho, s_ho, w_rec, s_rec = self._propagation_weights
+        
+        # Recurrent input from hidden NPUs that fired on the previous step
+        hidden_current = np.zeros(self.hidden_size, dtype=np.float32)
+        if self.w_rec is not None:
+            hidden_current += self._propagate(self.layers['hidden']['fired'], w_rec, s_rec)
+        
+        # Process input layer
+        fired_input = self._update_layer(self.layers['input'], input_current, time_step)
+        
+        # Process hidden layer, weighting input spikes by w_ih
+        hidden_current += self._propagate(fired_input, w_ih, s_ih)
+        fired_hidden = self._update_layer(self.layers['hidden'], hidden_current, time_step)
+        
+        # Process output layer, weighting hidden spikes by w_ho
+        output_current = self._propagate(fired_hidden, w_ho, s_ho)
+        self._update_layer(self.layers['output'], output_current, time_step)
     
     def process_input(self, input_spikes, current_time, time_step):
         """
@@ -122,68 +442,154 @@ class CorticalProcessingModule:
         if not self.active:
             return []
         
-        # Deliver input spikes to input layer NPUs
-        for input_index, spike_time in input_spikes:
-            if 0 <= input_index < self.input_size:
-                input_id = f"{self.id}_input_{input_index}"
-                # Create a dummy source ID for external inputs
-                self.input_npus[input_id].receive_spike("external", spike_time)
+        # Deliver recent input spikes to input layer NPUs by integer index
+        input_current = self._input_current
+        input_current.fill(0.0)
+        if len(input_spikes):
+            spikes = np.asarray(input_spikes, dtype=np.float64).reshape(-1, 2)
+            indices = spikes[:, 0].astype(np.intp)
+            valid = ((indices >= 0) & (indices < self.input_size)
+                     & (current_time - spikes[:, 1] <= time_step))
+            input_current += np.bincount(indices[valid], minlength=self.input_size)
         
-        # Process input layer
-        hidden_spikes = []
-        for input_id, input_npu in self.input_npus.items():
-            spikes = input_npu.update(current_time, time_step)
-            hidden_spikes.extend(spikes)
-        
-        # Process hidden layer
-        output_spikes = []
-        for hidden_id, hidden_npu in self.hidden_npus.items():
-            # Receive spikes from input layer
-            for target_id, spike_time in hidden_spikes:
-                if target_id == hidden_id:
-                    hidden_npu.receive_spike(target_id.split('_')[0], spike_time)
-            
-            # Update hidden NPU
-            spikes = hidden_npu.update(current_time, time_step)
-            output_spikes.extend(spikes)
-        
-        # Process output layer
-        final_output = []
-        for output_id, output_npu in self.output_npus.items():
-            # Receive spikes from hidden layer
-            for target_id, spike_time in output_spikes:
-                if target_id == output_id:
-                    output_npu.receive_spike(target_id.split('_')[0], spike_time)
-            
-            # Update output NPU
-            spikes = output_npu.update(current_time, time_step)
-            
-            # Convert internal output spikes to output indices
-            for _, spike_time in spikes:
-                output_index = int(output_id.split('_')[-1])
-                final_output.append((output_index, spike_time))
-        
-        # Track activity
-        total_activity = sum(1 for npu in list(self.input_npus.values()) + 
-                             list(self.hidden_npus.values()) + 
-                             list(self.output_npus.values()) 
-                             if npu.state.value > 0)
-        self.activity_history.append((current_time, total_activity))
-        
-        # Track output
-        self.output_history.append((current_time, final_output))
+        # Propagate spikes through the input, hidden and output layers
+        if NUMBA_AVAILABLE:
+            npus = self._all_npus
+            total_activity = self._forward_kernel(
+                npus['v'], npus['threshold'], npus['tau_m'], npus['refractory_period'],
+                npus['refractory_timer'], npus['state'], npus['fired'],
+                input_current, *self._propagation_weights,
+                self._recurrent_sum, self._input_sum, self._hidden_sum, time_step)
+        else:
+            self._forward_layers(input_current, time_step)
+            total_activity = np.count_nonzero(self._all_npus['state'])
+        
+        # Convert output layer firings to output indices
+        fired_output = self.layers['output']['fired']
+        final_output = [(int(output_index), current_time) for output_index in np.flatnonzero(fired_output)]
+        
+        # Track activity and output
+        self._track(current_time, int(total_activity), final_output)
         
         return final_output
     
+    def process_batch(self, input_counts, start_time, time_step):
+        """
+        Process a block of consecutive time steps at once.
+        
+        Equivalent to calling process_input once per row, but propagates
+        layer by layer: each layer runs over all steps before the next, so the
+        feed-forward currents of a whole block come from one matrix product.
+        
+        Args:
+            input_counts: Array of shape (steps, input_size) with the number of
+                input spikes each input NPU receives at every step
+            start_time: Simulation time of the first step (ms)
+            time_step: Duration of each time step (ms)
+            
+        Returns:
+            Boolean array of shape (steps, output_size) marking output firings
+        """
+        input_counts = np.asarray(input_counts, dtype=np.float32).reshape(-1, self.input_size)
+        steps = input_counts.shape[0]
+        if not self.active:
+            return np.zeros((steps, self.output_size), dtype=np.bool_)
+        
+        w_ih, s_ih, w_ho, s_ho, w_rec, s_rec = self._propagation_weights
+        no_recurrence = w_rec[:0]
+        
+        # Propagate layer by layer over the whole block
+        fired_input, active = self._run_layer_batch('input', input_counts, no_recurrence, s_rec, time_step)
+        hidden_currents = self._batch_currents(fired_input, w_ih, s_ih, 0)
+        fired_hidden, active_hidden = self._run_layer_batch('hidden', hidden_currents, w_rec, s_rec, time_step)
+        output_currents = self._batch_currents(fired_hidden, w_ho, s_ho, 1)
+        fired_output, active_output = self._run_layer_batch('output', output_currents, no_recurrence, s_rec, time_step)
+        active += active_hidden + active_output
+        
+        # Track activity and output per step
+        for t in range(steps):
+            current_time = start_time + t * time_step
+            final_output = [(int(output_index), current_time) for output_index in np.flatnonzero(fired_output[t])]
+            self._track(current_time, int(active[t]), final_output)
+        
+        return fired_output
+    
+    def _batch_currents(self, fired, weights, scale, device_index):
+        """Feed-forward currents for a block of steps, on the GPU when configured."""
+        if self._device_weights is None:
+            return (fired.astype(np.float32) @ weights.astype(np.float32)) * scale
+        product = cupy.matmul(cupy.asarray(fired, dtype=cupy.float32), self._device_weights[device_index])
+        return cupy.asnumpy(product) * scale
+    
+    def _run_layer_batch(self, name, currents, w_rec, s_rec, time_step):
+        """Run one layer over a block of steps; returns (fired, active count per step)."""
+        layer = self.layers[name]
+        steps = currents.shape[0]
+        fired = np.zeros(currents.shape, dtype=np.bool_)
+        active = np.zeros(steps, dtype=np.int64)
+        
+        if NUMBA_AVAILABLE:
+            recurrent_sum = np.zeros(currents.shape[1], dtype=np.float32)
+            trajectory = _serial_layer_trajectory
+            if currents.shape[1] >= PARALLEL_MIN_SIZE:
+                trajectory = _parallel_layer_trajectory
+            trajectory(layer['v'], layer['threshold'], layer['tau_m'], layer['refractory_period'],
+                       layer['refractory_timer'], layer['state'], layer['fired'],
+                       currents, w_rec, s_rec, recurrent_sum, time_step, fired, active)
+            return fired, active
+        
+        for t in range(steps):
+            current = currents[t]
+            if w_rec.shape[0]:
+                current = current + self._propagate(layer['fired'], w_rec, s_rec)
+            fired[t] = self._update_layer(layer, current, time_step)
+            active[t] = np.count_nonzero(layer['state'])
+        return fired, active
+    
+    def _track(self, current_time, total_activity, final_output):
+        """Record one step of activity and output."""
+        if len(self.activity_history) == ACTIVITY_WINDOW:
+            self._activity_sum -= self.activity_history[0]
+        self.activity_history.append(total_activity)
+        self._activity_sum += total_activity
+        
+        self.output_history.append((current_time, final_output))
+    
     def set_modulation(self, modulation_factor):
         """Set the local modulation factor for this CPM."""
         self.local_modulation = max(0.1, min(2.0, modulation_factor))
         
         # Apply modulation to NPU thresholds
-        for npu in list(self.input_npus.values()) + list(self.hidden_npus.values()) + list(self.output_npus.values()):
-            # Higher modulation lowers threshold (makes firing easier)
-            base_threshold = -55.0
-            npu.threshold = base_threshold / self.local_modulation
+        # Higher modulation lowers threshold (makes firing easier)
+        self._all_npus['threshold'][:] = BASE_THRESHOLD / self.local_modulation
+    
+    def npu_id(self, layer, index):
+        """
+        Get the legacy string ID of an NPU, e.g. "sensory_0_hidden_3".
+        
+        IDs are built on request only; the simulation addresses NPUs by
+        their index in the layer arrays.
+        """
+        return f"{self.id}_{layer}_{index}"
+    
+    def get_synapses(self, layer, index):
+        """
+        Get the outgoing synapses of one NPU as a {target NPU ID: weight} dict.
+        
+        Built on request from the weight matrices, in the form the per-NPU
+        synapse dicts used to take.
+        """
+        targets = {'input': ('hidden', self.w_ih), 'hidden': ('output', self.w_ho)}
+        synapses = {}
+        if layer in targets:
+            target_layer, weights = targets[layer]
+            for target_index, weight in enumerate(weights[index]):
+                synapses[self.npu_id(target_layer, target_index)] = float(weight)
+        if layer == 'hidden' and self.w_rec is not None:
+            for target_index, weight in enumerate(self.w_rec[index]):
+                if target_index != index:
+                    synapses[self.npu_id('hidden', target_index)] = float(weight)
+        return synapses
     
     def get_activity_level(self):
         """Get the current activity level of the CPM."""
@@ -191,5 +597,4 @@ class CorticalProcessingModule:
             return 0.0
         
         # Return average activity over recent history
-        recent_activity = [activity for _, activity in self.activity_history[-10:]]
-        return sum(recent_activity) / len(recent_activity) if recent_activity else 0.0
+        return self._activity_sum / len(self.activity_history)
@@ -1,14 +1,15 @@
 import numpy as np
 import matplotlib.pyplot as plt
-from matplotlib.animation import FuncAnimation
 import matplotlib.gridspec as gridspec
-from matplotlib.patches import Rectangle, Circle, Arrow, FancyArrowPatch, Polygon
+from matplotlib.patches import Rectangle, Circle, Arrow
 from matplotlib.widgets import Button, Slider, RadioButtons
+from matplotlib.collections import EllipseCollection, LineCollection, PolyCollection
 from matplotlib import colors # Import the colors module here
 import time
 from enum import Enum
-from collections import defaultdict
-import random
+from collections import deque
+
+from jit import njit, NUMBA_AVAILABLE
 
 # Set style for better visuals
 plt.style.use('dark_background')
@@ -20,73 +21,98 @@ class NPUState(Enum):
     FIRING = 2
     REFRACTORY = 3
 
+# NPU colors by state value - more vibrant colors
+STATE_COLORS = ['#1f77b4',  # Resting: blue
+                '#ff7f0e',  # Integration: orange
+                '#d62728',  # Firing: red
+                '#9467bd']  # Refractory: purple
+
+# Time span shown by the activity graph (arbitrary units)
+ACTIVITY_WINDOW = 50
+
+# Integer NPU state codes used by the module state arrays
+_RESTING = NPUState.RESTING.value
+_INTEGRATION = NPUState.INTEGRATION.value
+_REFRACTORY = NPUState.REFRACTORY.value
+
+# LIF kernels specialized on their constants, shared by modules with equal parameters
+_LIF_KERNELS = {}
+
+def make_lif_step(leak, gain, v_reset, v_integrate):
+    """
+    Get a compiled leaky integrate-and-fire step with its constants baked in.
+    
+    The returned step(V, threshold, state, inputs, noise, spiked) updates a
+    module's NPU arrays in place and fills spiked. The constants are closure
+    variables, which Numba freezes into the machine code as immediates. It
+    uses conditional selects rather than early exits so the unpredictable
+    spike and state checks compile to branch-free code.
+    """
+    key = (leak, gain, v_reset, v_integrate)
+    step = _LIF_KERNELS.get(key)
+    if step is None:
+        @njit(fastmath=True)
+        def step(V, threshold, state, inputs, noise, spiked):
+            for i in range(V.size):
+                v = V[i] * leak + (inputs[i] + noise[i]) * gain
+                fired = v >= threshold[i]
+                spiked[i] = fired
+                # Reset below resting and immediately enter refractory state
+                v = v_reset if fired else v
+                V[i] = v
+                # Refractory NPUs stay refractory until potential recovers somewhat
+                was_refractory = state[i] == _REFRACTORY
+                integrating = v >= v_integrate if was_refractory else v > v_integrate
+                refractory = (fired or was_refractory) and not integrating
+                state[i] = _REFRACTORY if refractory else (_INTEGRATION if integrating else _RESTING)
+        _LIF_KERNELS[key] = step
+    return step
+
 class NeuralProcessingUnit:
-    def __init__(self, id, threshold=-55.0, position=(0, 0)):
+    """View of one NPU for the renderer; its dynamics live in the module's arrays."""
+    def __init__(self, id, module, index, position=(0, 0)):
         self.id = id
-        self.membrane_potential = -70.0
-        self.threshold = threshold
-        self.state = NPUState.RESTING
-        self.connections = {}
-        self.spike_history = []
+        self.module = module
+        self.index = index  # Position in the module's state arrays
         self.position = position  # For visualization
         self.size = 0.2  # Visual size
         self.color = '#1f77b4'  # Default color
-        self.last_update_time = 0
-        
-    def add_connection(self, target_id, weight=0.5):
-        self.connections[target_id] = weight
-        
-    def update(self, inputs, current_time):
-        self.last_update_time = current_time
         
-        # Simple leaky integrate-and-fire model
-        # More significant leak and integration for faster dynamics
-        self.membrane_potential *= 0.85 # Increased Leak
+    @property
+    def membrane_potential(self):
+        return float(self.module.V[self.index])
+    
+    @membrane_potential.setter
+    def membrane_potential(self, value):
+        self.module.V[self.index] = value
         
-        # Process inputs - increased impact and added noise
-        input_sum = sum(inputs) + (random.random() - 0.5) * 2 # Add random noise
-        self.membrane_potential += input_sum * 3 # Increased input impact
-            
-        # Check for spike
-        if self.membrane_potential >= self.threshold:
-            self.state = NPUState.FIRING
-            self.spike_history.append(current_time)
-            if len(self.spike_history) > 20:  # Keep history limited
-                self.spike_history.pop(0)
-            self.membrane_potential = -75.0  # Reset potential below resting
-            # Immediately enter refractory state after firing
-            self.state = NPUState.REFRACTORY 
-            return [(target_id, self.connections[target_id]) for target_id in self.connections]
-        
-        # State transitions after processing input
-        if self.state == NPUState.REFRACTORY:
-             # Stay in refractory for a short period (e.g., until potential recovers somewhat)
-             if self.membrane_potential >= -65.0:
-                 self.state = NPUState.INTEGRATION
-             # Otherwise remains in REFRACTORY implicitly until potential rises
-        elif self.membrane_potential > -65.0: # Integrated enough to be considered active
-             self.state = NPUState.INTEGRATION
-        else:
-             self.state = NPUState.RESTING # Below integration threshold
-
-        return []
+    @property
+    def threshold(self):
+        return float(self.module.threshold[self.index])
+    
+    @property
+    def state(self):
+        return NPUState(int(self.module.state[self.index]))
+    
+    @state.setter
+    def state(self, value):
+        self.module.state[self.index] = value.value
         
     def get_color(self):
-        # Color based on state - more vibrant colors
-        if self.state == NPUState.RESTING:
-            return '#1f77b4'  # Blue
-        elif self.state == NPUState.INTEGRATION:
-            return '#ff7f0e'  # Orange
-        elif self.state == NPUState.FIRING:
-            return '#d62728'  # Red
-        else:  # REFRACTORY
-            return '#9467bd'  # Purple
+        # Color based on state
+        return STATE_COLORS[self.module.state[self.index]]
 
 class CorticalProcessingModule:
-    def __init__(self, id, size=10, position=(0, 0), radius=1.5):
+    # RGBA color of each NPU state, parsed once and indexed by state value
+    _STATE_RGBA = np.array([colors.to_rgba(c) for c in STATE_COLORS])
+    
+    def __init__(self, id, size=10, position=(0, 0), radius=1.5, seed=None):
         self.id = id
+        self._rng = np.random.default_rng(seed) # Seed or shared Generator for connectivity and noise
         self.npus = {}
-        self.activity_history = []
+        # Activity history as parallel deques appended in lockstep, oldest dropped first
+        self.activity_times = deque(maxlen=100)
+        self.activity_values = deque(maxlen=100)
         self.position = position
         self.radius = radius
         self.color = '#2ca02c'  # Default Green (overridden in demo)
@@ -94,83 +120,165 @@ class CorticalProcessingModule:
         self.activity_level = 0.0 # Track current activity level
         self.outline_patch = None # Matplotlib patch for the outline circle
         
+        # NPU state as structure-of-arrays, indexed like self.npus
+        self.N = size
+        self.V = np.full(size, -70.0, dtype=np.float32)  # Membrane potentials
+        self.threshold = np.full(size, -55.0, dtype=np.float32)
+        self.state = np.full(size, _RESTING, dtype=np.int8)
+        self.last_spike = np.full(size, -np.inf)  # Time of each NPU's latest spike
+        
         # Create NPUs in a circular arrangement
         for i in range(size):
             angle = 2 * np.pi * i / size
             npu_x = position[0] + radius * 0.7 * np.cos(angle)
             npu_y = position[1] + radius * 0.7 * np.sin(angle)
             npu_id = f"{id}_{i}"
-            self.npus[npu_id] = NeuralProcessingUnit(npu_id, position=(npu_x, npu_y))
+            self.npus[npu_id] = NeuralProcessingUnit(npu_id, self, i, position=(npu_x, npu_y))
+        self._npu_ids = tuple(self.npus)
+        self.npu_positions = np.array([npu.position for npu in self.npus.values()], dtype=np.float32) # (N, 2), for drawing
+        self._input_targets = {} # Target NPU index of each input, cached per input count
+        # Per-step work buffers, reused so process() doesn't allocate them every frame
+        self._input_buf = np.zeros(size, dtype=np.float32)
+        self._noise_buf = np.zeros(size, dtype=np.float32)
+        self._spiked = np.zeros(size, dtype=np.bool_)
+        
+        # LIF parameters - more significant leak and integration for faster dynamics
+        self.leak = 0.85 # Increased Leak
+        self.input_gain = 3.0 # Increased input impact
+        self.reset_potential = -75.0 # Reset below resting after a spike
+        self.integration_potential = -65.0 # Above this an NPU counts as integrating
+        
+        # Compile the LIF kernel now so the first animation frame isn't stalled
+        self._lif_step = make_lif_step(self.leak, self.input_gain, self.reset_potential, self.integration_potential)
+        empty = np.zeros(0, dtype=np.float32)
+        self._lif_step(empty, empty, np.zeros(0, dtype=np.int8), empty, empty,
+                       np.zeros(0, dtype=np.bool_))
             
         # Connect NPUs (simple random connectivity within the module)
-        npu_list = list(self.npus.keys())
-        for source_id in npu_list:
-            for _ in range(int(size * 0.3)): # Attempt to connect ~30% of others
-                 target_id = random.choice(npu_list)
-                 if source_id != target_id:
-                     weight = np.random.random() * 0.5 + 0.5  # Higher weights (0.5-1.0)
-                     self.npus[source_id].add_connection(target_id, weight)
-                     # Store connection data if needed for drawing internal connections
-                     # self.connections.append((source_id, target_id, weight))
+        # W[source, target] holds the connection weights, 0 where unconnected
+        self.W = np.zeros((size, size), dtype=np.float32)
+        attempts = int(size * 0.3) # Attempt to connect ~30% of others
+        sources = np.repeat(np.arange(size), attempts)
+        targets = self._rng.integers(size, size=size * attempts)
+        weights = self._rng.random(size * attempts, dtype=np.float32) * 0.5 + 0.5  # Higher weights (0.5-1.0)
+        no_self = sources != targets
+        self.W[sources[no_self], targets[no_self]] = weights[no_self]
     
     def process(self, inputs, current_time):
-        outputs = []
-        active_npus = 0
-        spikes = []
-        
-        # Prepare inputs mapped to NPUs (e.g., distribute evenly)
-        npu_inputs = {npu_id: [] for npu_id in self.npus}
-        if inputs:
-            for i, input_val in enumerate(inputs):
-                # Ensure input_val is a list of numeric values or becomes one
-                input_vals_list = []
-                if isinstance(input_val, np.ndarray) and input_val.size == 1:
-                    input_vals_list = [float(input_val)]
-                elif isinstance(input_val, (int, float)):
-                    input_vals_list = [float(input_val)]
-                elif isinstance(input_val, (list, tuple, np.ndarray)):
-                    input_vals_list = [float(x) for x in input_val if isinstance(x, (int, float, np.ndarray))]
-
-                if input_vals_list:
-                    target_npu_id = list(self.npus.keys())[i % len(self.npus)]
-                    npu_inputs[target_npu_id].extend(input_vals_list)
-
-
-        # Process each NPU
-        current_outputs = {} # Collect outputs temporarily to prevent immediate downstream effect in same time step
-        for npu_id, npu in self.npus.items():
-            # Ensure npu_inputs[npu_id] is always a list
-            npu_output = npu.update(npu_inputs.get(npu_id, []), current_time)
-            if npu_output:
-                current_outputs[npu_id] = npu_output
-
-            # Track activity
-            if npu.state != NPUState.RESTING:
-                active_npus += 1
-                
-            # Track spikes for visualization
-            if npu.state == NPUState.FIRING:
-                spikes.append(npu_id)
-        
-        # Flatten outputs from all NPUs in this module
-        for npu_id, npu_outputs in current_outputs.items():
-             outputs.extend(npu_outputs)
+        """Run one step; inputs is a 1-D sequence of input values (or None)."""
+        # Sum the inputs mapped to each NPU (distributed evenly)
+        inputs = np.asarray(inputs if inputs is not None else [], dtype=np.float32).ravel()
+        input_vec = self._input_buf
+        input_vec.fill(0.0)
+        np.add.at(input_vec, self._targets_for(inputs.size), inputs)
+
+        # Simple leaky integrate-and-fire step over all NPUs at once
+        noise = self._rng.random(out=self._noise_buf, dtype=np.float32) # Add random noise
+        noise -= 0.5
+        noise *= 2
+        spiked = self._spiked
+        if NUMBA_AVAILABLE:
+            self._lif_step(self.V, self.threshold, self.state, input_vec, noise, spiked)
+        else:
+            self.V *= self.leak
+            self.V += (input_vec + noise) * self.input_gain
+            
+            # Spiking NPUs reset below resting and immediately enter refractory state
+            np.greater_equal(self.V, self.threshold, out=spiked)
+            self.V[spiked] = self.reset_potential
+            
+            # State transitions as mask arithmetic (RESTING is 0); refractory NPUs
+            # stay refractory until potential recovers
+            was_refractory = self.state == _REFRACTORY
+            integrating = np.where(was_refractory, self.V >= self.integration_potential,
+                                   self.V > self.integration_potential)
+            refractory = (spiked | was_refractory) & ~integrating
+            self.state[:] = integrating * _INTEGRATION + refractory * _REFRACTORY
+        self.last_spike[spiked] = current_time
+        
+        # Indices of spiking NPUs go downstream; spikes are tracked for visualization
+        spike_indices = np.flatnonzero(spiked)
+        spikes = [self._npu_ids[i] for i in spike_indices]
+        active_npus = int(np.count_nonzero(self.state != _RESTING))
 
         # Record activity level
-        self.activity_level = active_npus / len(self.npus) if self.npus else 0
-        self.activity_history.append((current_time, self.activity_level))
-        if len(self.activity_history) > 100:  # Keep history limited
-            self.activity_history.pop(0)
+        self.activity_level = active_npus / self.N if self.N else 0
+        self.activity_times.append(current_time)
+        self.activity_values.append(self.activity_level)
+            
+        return spike_indices, self.activity_level, spikes
+    
+    def projection(self, target_size):
+        """
+        Build the (N, target_size) matrix of signal sent to a downstream module.
+        
+        Row i holds what NPU i delivers when it spikes: each of its connection
+        weights, routed to downstream NPU (target index % target_size).
+        """
+        routing = np.zeros((self.N, target_size), dtype=np.float32)
+        routing[np.arange(self.N), np.arange(self.N) % target_size] = 1.0
+        return self.W @ routing
+    
+    def _targets_for(self, input_count):
+        """Index of the NPU receiving each of input_count inputs (input i goes to NPU i % N)."""
+        targets = self._input_targets.get(input_count)
+        if targets is None:
+            targets = np.arange(input_count) % self.N
+            self._input_targets[input_count] = targets
+        return targets
+    
+    def reset(self):
+        """Return all NPUs to their resting state."""
+        self.V.fill(-70.0)
+        self.state.fill(_RESTING)
+        self.last_spike.fill(-np.inf)
+
+class FlowParticles:
+    """Flow particles stored as parallel float32 NumPy arrays, one row per particle."""
+    def __init__(self):
+        self.clear()
+        
+    def clear(self):
+        self.conn_idx = np.empty(0, dtype=np.intp)  # Index of the module connection each particle follows
+        self.progress = np.empty(0, dtype=np.float32)
+        self.speed = np.empty(0, dtype=np.float32)
+        self.size = np.empty(0, dtype=np.float32)
+        
+    def __len__(self):
+        return len(self.progress)
+    
+    def add(self, conn_idx, progress, speed, size):
+        """Append a batch of particles; each argument has one entry per new particle."""
+        self.conn_idx = np.concatenate([self.conn_idx, conn_idx])
+        self.progress = np.concatenate([self.progress, progress])
+        self.speed = np.concatenate([self.speed, speed])
+        self.size = np.concatenate([self.size, size])
+        
+    def advance(self, speed_factor):
+        """Move all particles along their paths and drop those that reached the end."""
+        self.progress += self.speed * np.float32(speed_factor)
+        alive = self.progress < 1.0
+        if not alive.all():
+            self.conn_idx = self.conn_idx[alive]
+            self.progress = self.progress[alive]
+            self.speed = self.speed[alive]
+            self.size = self.size[alive]
             
-        return outputs, self.activity_level, spikes
+    def positions(self, conn_src, conn_tgt):
+        """Particle positions, given the (K, 2) source and target points of each connection."""
+        source = conn_src[self.conn_idx]
+        return source + self.progress[:, None] * (conn_tgt[self.conn_idx] - source)
 
 class NeuronOSEnhancedDemo:
-    def __init__(self):
+    def __init__(self, seed=None, sim_steps_per_frame=1):
+        # One random stream for the whole demo; pass a seed for a repeatable run
+        self.rng = np.random.default_rng(seed)
+        
         # Create modules in a horizontal arrangement
         self.modules = {
-            "sensory": CorticalProcessingModule("sensory", 12, position=(3, 5), radius=1.5),
-            "processing": CorticalProcessingModule("processing", 16, position=(8, 5), radius=1.8),
-            "executive": CorticalProcessingModule("executive", 10, position=(13, 5), radius=1.3)
+            "sensory": CorticalProcessingModule("sensory", 12, position=(3, 5), radius=1.5, seed=self.rng),
+            "processing": CorticalProcessingModule("processing", 16, position=(8, 5), radius=1.8, seed=self.rng),
+            "executive": CorticalProcessingModule("executive", 10, position=(13, 5), radius=1.3, seed=self.rng)
         }
         
         # Connect modules (using module IDs for flow visualization)
@@ -178,17 +286,31 @@ class NeuronOSEnhancedDemo:
             ("sensory", "processing"),
             ("processing", "executive")
         ]
+        # Signal each source NPU sends along each module connection when it spikes
+        self.projections = {
+            (source, target): self.modules[source].projection(self.modules[target].N)
+            for source, target in self.module_connections
+        }
         
         # System state
         self.current_time = 0
-        self.activity_history = defaultdict(list) # Still store history per module for the graph
+        # Activity graph history: fixed-size ring buffers of the last 100 steps,
+        # with act_head at the newest entry
+        self.act_x = np.zeros(100) # Time of each entry
+        self.act_y = {module_name: np.zeros(100) for module_name in self.modules} # Activity level per module
+        self.act_head = -1
+        self.act_count = 0
         self.active_spikes_data = []  # Data for spikes (module_id, npu_id)
-        self.flow_particles_data = [] # Data for flow particles (source, target, progress, speed, size, color)
+        self.active_spike_positions = np.empty((0, 2)) # Positions of the NPUs that just spiked
+        self.flow_particles = FlowParticles() # Particles flowing along module connections
         
         # Matplotlib artists to update - Initialize as empty or None
-        self.npu_patches = {} # Maps npu_id to matplotlib Circle patch
-        self.spike_patches = [] # List of matplotlib Circle patches for current spikes/glows
-        self.flow_particle_patches = [] # List of (particle_data, particle_circle_patch, glow_circle_patch) tuples
+        self.npu_collection = None # One circle per NPU, colored by state
+        self._npu_drawn_states = None # NPU states the collection is currently colored by
+        self.spike_collection = None # Circles marking NPUs that just spiked
+        self.spike_glow_collection = None # Glow drawn behind each spike circle
+        self.flow_particle_collection = None # Circles drawn for the flow particles
+        self.flow_glow_collection = None # Glow drawn behind each flow particle
         self.activity_lines = {} # Maps module_name to matplotlib Line2D
         self.info_text_artist = None # Text artist for displaying simulation info
         self.module_outline_patches = {} # Maps module_name to outline patch for activity indication
@@ -196,6 +318,8 @@ class NeuronOSEnhancedDemo:
         # Demo state
         self.running = False
         self.speed = 1.0
+        self.sim_steps_per_frame = sim_steps_per_frame # Simulation steps run per drawn frame
+        self._dirty = True # Whether the artists need updating from the simulation state
         self.input_type = "pattern" # Default input type
         
         # Title and subtitle
@@ -209,11 +333,16 @@ class NeuronOSEnhancedDemo:
             "executive": "#e74c3c"    # Red
         }
         
+        # Static connection geometry and colors, one row per module connection
+        self._conn_src = np.array([self.modules[source].position for source, _ in self.module_connections], dtype=np.float32)
+        self._conn_tgt = np.array([self.modules[target].position for _, target in self.module_connections], dtype=np.float32)
+        self._conn_rgba = np.array([colors.to_rgba(self.module_colors[source]) for source, _ in self.module_connections])
+        
     def generate_input(self):
         """Generate input based on selected type"""
         if self.input_type == "random":
             # Random binary pattern
-            return (np.random.rand(10) > 0.6).astype(float) * 3 # Stronger inputs
+            return (self.rng.random(10) > 0.6).astype(float) * 3 # Stronger inputs
         elif self.input_type == "pattern":
             # Alternating pattern
             pattern_idx = int(self.current_time * 0.1) % 3 # Use current_time scaled by 0.1
@@ -236,14 +365,13 @@ class NeuronOSEnhancedDemo:
         """Update the simulation logic, *not* the visuals."""
         if not self.running:
             return
+        self._dirty = True
             
         # Update time
         self.current_time += 0.1 * self.speed # Fixed time step
 
         # Generate input
         current_input = self.generate_input()
-        # Ensure current_input is a list of floats for processing
-        current_input_list = [float(x) for x in current_input]
         
         # Process through modules
         all_module_outputs = {}
@@ -251,14 +379,14 @@ class NeuronOSEnhancedDemo:
         all_spikes_data = []
         
         # --- Sensory Module ---
-        sensory_output, sensory_activity, sensory_spikes = self.modules["sensory"].process(current_input_list, self.current_time)
+        sensory_output, sensory_activity, sensory_spikes = self.modules["sensory"].process(current_input, self.current_time)
         all_module_outputs["sensory"] = sensory_output
         module_activity_levels["sensory"] = sensory_activity
         all_spikes_data.extend([("sensory", spike_id) for spike_id in sensory_spikes])
 
         # --- Processing Module ---
-        # Input to processing comes from sensory outputs (weights represent signal strength)
-        processing_input = [weight for _, weight in all_module_outputs["sensory"]]
+        # Input to processing comes from sensory spikes (weights represent signal strength)
+        processing_input = self.projections[("sensory", "processing")][all_module_outputs["sensory"]].sum(axis=0)
         processing_output, processing_activity, processing_spikes = self.modules["processing"].process(processing_input, self.current_time)
         all_module_outputs["processing"] = processing_output
         module_activity_levels["processing"] = processing_activity
@@ -266,7 +394,7 @@ class NeuronOSEnhancedDemo:
         
         # --- Executive Module ---
         # Input to executive comes from processing outputs
-        executive_input = [weight for _, weight in all_module_outputs["processing"]]
+        executive_input = self.projections[("processing", "executive")][all_module_outputs["processing"]].sum(axis=0)
         executive_output, executive_activity, executive_spikes = self.modules["executive"].process(executive_input, self.current_time)
         all_module_outputs["executive"] = executive_output
         module_activity_levels["executive"] = executive_activity
@@ -277,9 +405,16 @@ class NeuronOSEnhancedDemo:
              self.modules[module_name].activity_level = level
 
 
-        # The activity_history is updated within each module's process method.
+        # Record this step in the activity graph ring buffers
+        self.act_head = (self.act_head + 1) % len(self.act_x)
+        self.act_count = min(self.act_count + 1, len(self.act_x))
+        self.act_x[self.act_head] = self.current_time
+        for module_name, level in module_activity_levels.items():
+            self.act_y[module_name][self.act_head] = level
 
         self.active_spikes_data = all_spikes_data
+        self.active_spike_positions = np.concatenate([self.modules[module_name].npu_positions[spike_indices]
+                                                      for module_name, spike_indices in all_module_outputs.items()])
         
         # Update flow particles data
         self.update_flow_particles_data()
@@ -289,48 +424,19 @@ class NeuronOSEnhancedDemo:
         """Update the data for flow particles (positions, progress)."""
         # Add new particles frequently
         # Increased particle generation chance and density
-        if random.random() < 0.8: 
-            for source, target in self.module_connections:
-                # Add multiple particles per step
-                num_particles_to_add = random.randint(1, 3) 
-                for _ in range(num_particles_to_add):
-                    source_pos = self.modules[source].position
-                    target_pos = self.modules[target].position
-                    # Start particle near the source module center
-                    t = random.random() * 0.1 # Start within first 10% of the path
-                    x = source_pos[0] + t * (target_pos[0] - source_pos[0])
-                    y = source_pos[1] + t * (target_pos[1] - source_pos[1])
-                    self.flow_particles_data.append({
-                        'source': source,
-                        'target': target,
-                        'position': (x, y),
-                        'progress': t,
-                        'speed': 0.02 + random.random() * 0.02,  # Random speed
-                        'size': 0.2 + random.random() * 0.15,     # Random size
-                        'color': self.module_colors[source]      # Color based on source module
-                    })
-        
-        # Update existing particles data and remove finished ones
-        updated_particles_data = []
-        for particle in self.flow_particles_data:
-            source_pos = self.modules[particle['source']].position
-            target_pos = self.modules[particle['target']].position
-            
-            # Update progress - speed scales with global speed
-            particle['progress'] += particle['speed'] * self.speed 
-            
-            # If particle reached the end, don't keep it
-            if particle['progress'] >= 1.0:
-                continue # Don't add to updated_particles_data
-
-            # Update position
-            x = source_pos[0] + particle['progress'] * (target_pos[0] - source_pos[0])
-            y = source_pos[1] + particle['progress'] * (target_pos[1] - source_pos[1])
-            particle['position'] = (x, y)
-            
-            updated_particles_data.append(particle)
-            
-        self.flow_particles_data = updated_particles_data
+        if self.rng.random() < 0.8: 
+            # Add multiple particles per connection per step, all drawn in one batch
+            counts = self.rng.integers(1, 4, size=len(self.module_connections))
+            total = counts.sum()
+            new_conn_idx = np.repeat(np.arange(len(self.module_connections)), counts)
+            # Start particles near the source module center, within first 10% of the path
+            new_progress = self.rng.random(total, dtype=np.float32) * 0.1
+            new_speed = 0.02 + self.rng.random(total, dtype=np.float32) * 0.02  # Random speed
+            new_size = 0.2 + self.rng.random(total, dtype=np.float32) * 0.15     # Random size
+            self.flow_particles.add(new_conn_idx, new_progress, new_speed, new_size)
+        
+        # Update existing particles and remove finished ones - speed scales with global speed
+        self.flow_particles.advance(self.speed)
 
     def setup_visualization(self):
         """Set up the visualization with a completely reimagined layout"""
@@ -361,10 +467,12 @@ class NeuronOSEnhancedDemo:
         # Bottom panel for activity graph (spans bottom row, middle column)
         self.ax_bottom = plt.subplot(gs[1, 1])
         self.ax_bottom.set_title("Module Activity", fontsize=14, color='white')
-        self.ax_bottom.set_xlabel("Time (arbitrary units)", fontsize=12, color='white')
+        self.ax_bottom.set_xlabel("Time before now (arbitrary units)", fontsize=12, color='white')
         self.ax_bottom.set_ylabel("Activity (fraction active)", fontsize=12, color='white')
         self.ax_bottom.set_ylim(0, 1.05) # Allow slightly above 1 for visual padding
-        # x-limits will be set dynamically for sliding window
+        # Activity is plotted against time relative to now, so the sliding window's
+        # x-limits never change and the blit background stays valid
+        self.ax_bottom.set_xlim(-ACTIVITY_WINDOW, 0)
         self.ax_bottom.tick_params(labelsize=10, colors='white')
         self.ax_bottom.patch.set_facecolor('#333333') # Darker background for graph
         self.ax_bottom.spines['top'].set_color('white')
@@ -434,31 +542,64 @@ class NeuronOSEnhancedDemo:
         # Draw static elements of the system (modules, connections) and create initial module outline patches
         self.draw_static_system_elements(self.ax_main)
 
-        # Create initial NPU patches and store references
-        # These are static in terms of existence, only their color updates
-        for module_name, module in self.modules.items():
-             for npu_id, npu in module.npus.items():
-                 circle = plt.Circle(npu.position, npu.size, facecolor=npu.get_color(), edgecolor='white', alpha=0.8, zorder=3)
-                 self.ax_main.add_patch(circle)
-                 self.npu_patches[npu_id] = circle
-
-        # Initialize the list of artists to update for blitting
-        # This list will be built dynamically in update_visual_artists
-        # Start with persistent artists that always exist but change properties
-        self._artists = list(self.npu_patches.values()) + list(self.activity_lines.values()) + list(self.module_outline_patches.values()) + [self.info_text_artist]
-
-
-        # Initial draw/update to set everything up
-        # We don't return artists here, FuncAnimation handles the first draw
+        # Create the NPU circles as one collection, in module order
+        # These are static in terms of existence, only their colors update
+        all_npus = [npu for module in self.modules.values() for npu in module.npus.values()]
+        npu_diameters = [npu.size * 2 for npu in all_npus]
+        self.npu_collection = EllipseCollection(npu_diameters, npu_diameters, 0.0, units='xy',
+                                                offsets=[npu.position for npu in all_npus],
+                                                offset_transform=self.ax_main.transData,
+                                                edgecolors='white', alpha=0.8, zorder=3)
+        self.ax_main.add_collection(self.npu_collection, autolim=False)
+        self.update_npu_colors()
+
+        # Spike markers: one collection each for glows and circles, sized in data units
+        # and repositioned every frame
+        npu_size = self.modules["sensory"].npus["sensory_0"].size
+        no_spikes = np.empty((0, 2))
+        self.spike_glow_collection = EllipseCollection(npu_size * 5.0, npu_size * 5.0, 0.0, units='xy',
+                                                       offsets=no_spikes, offset_transform=self.ax_main.transData,
+                                                       facecolors='yellow', edgecolors='none', alpha=0.4, zorder=4)
+        self.spike_collection = EllipseCollection(npu_size * 3.6, npu_size * 3.6, 0.0, units='xy',
+                                                  offsets=no_spikes, offset_transform=self.ax_main.transData,
+                                                  facecolors='yellow', edgecolors='white', alpha=0.9, linewidths=0.5, zorder=5)
+        self.ax_main.add_collection(self.spike_glow_collection, autolim=False)
+        self.ax_main.add_collection(self.spike_collection, autolim=False)
+        
+        # Flow particle markers, resized and recolored every frame
+        self.flow_glow_collection = EllipseCollection([], [], 0.0, units='xy',
+                                                      offsets=no_spikes, offset_transform=self.ax_main.transData,
+                                                      edgecolors='none', alpha=0.3, zorder=6)
+        self.flow_particle_collection = EllipseCollection([], [], 0.0, units='xy',
+                                                          offsets=no_spikes, offset_transform=self.ax_main.transData,
+                                                          edgecolors='white', linewidths=0.5, zorder=7)
+        self.ax_main.add_collection(self.flow_glow_collection, autolim=False)
+        self.ax_main.add_collection(self.flow_particle_collection, autolim=False)
+
+        # The artists redrawn when blitting. They all exist for the life of the figure
+        # and update_visual_artists only changes their properties, so this list is fixed
+        self._artists = (list(self.module_outline_patches.values())
+                         + [self.npu_collection, self.spike_glow_collection, self.spike_collection,
+                            self.flow_glow_collection, self.flow_particle_collection,
+                            self.info_text_artist] + list(self.activity_lines.values()))
+
+
+        # Blitted artists are left out of full draws, which only refresh the background
+        for artist in self._artists:
+            artist.set_animated(True)
+        self._background = None
+        # Every full draw (first show, resize, widget redraws) recaptures the background
+        self.fig.canvas.mpl_connect('draw_event', self.on_draw)
+
+        # Initial update to set everything up; the first draw comes from showing the figure
         self.update_visual_artists(self.ax_main, self.ax_bottom)
 
-        # FuncAnimation needs the figure object
         return self.fig
 
     def add_state_legend(self, ax):
         """Add a legend for NPU states within a specific axes."""
         states = [NPUState.RESTING, NPUState.INTEGRATION, NPUState.FIRING, NPUState.REFRACTORY]
-        colors_list = ['#1f77b4', '#ff7f0e', '#d62728', '#9467bd'] # Renamed to avoid conflict
+        colors_list = [STATE_COLORS[state.value] for state in states] # Renamed to avoid conflict
         labels = ['Resting', 'Integration', 'Firing', 'Refractory']
         
         # Position legend within the axes using axes coordinates (0 to 1)
@@ -475,48 +616,27 @@ class NeuronOSEnhancedDemo:
 
     def draw_static_system_elements(self, ax):
         """Draw static background elements of the system and create dynamic outline patches."""
-        # Draw module connections paths (background)
-        for source, target in self.module_connections:
-            source_pos = self.modules[source].position
-            target_pos = self.modules[target].position
-            
-            dx = target_pos[0] - source_pos[0]
-            dy = target_pos[1] - source_pos[1]
-            length = np.sqrt(dx*dx + dy*dy)
-            width = 0.5 # Width of the path
-            
-            # Calculate perpendicular direction
-            perp_dx = -dy / length
-            perp_dy = dx / length
-            
-            # Create polygon points for the path
-            points = [
-                (source_pos[0] + perp_dx * width/2, source_pos[1] + perp_dy * width/2),
-                (source_pos[0] - perp_dx * width/2, source_pos[1] - perp_dy * width/2),
-                (target_pos[0] - perp_dx * width/2, target_pos[1] - perp_dy * width/2),
-                (target_pos[0] + perp_dx * width/2, target_pos[1] + perp_dy * width/2)
-            ]
-            
-            # Draw the path
-            path = Polygon(points, closed=True, facecolor='#333333', edgecolor='none', alpha=0.5, zorder=0)
-            ax.add_patch(path)
-            
-            # Add arrow to show direction
-            mid_x = (source_pos[0] + target_pos[0]) / 2
-            mid_y = (source_pos[1] + target_pos[1]) / 2
-            arrow_length = 0.8
-            arrow_dx = arrow_length * dx / length
-            arrow_dy = arrow_length * dy / length
-            
-            arrow = FancyArrowPatch((mid_x - arrow_dx/2, mid_y - arrow_dy/2), 
-                                   (mid_x + arrow_dx/2, mid_y + arrow_dy/2),
-                                   arrowstyle='->', 
-                                   mutation_scale=30, # Larger arrow head
-                                   linewidth=2,
-                                   color='white', 
-                                   alpha=0.8,
-                                   zorder=1)
-            ax.add_patch(arrow)
+        # Draw module connections paths (background), all paths as one collection
+        direction = self._conn_tgt - self._conn_src
+        unit = direction / np.linalg.norm(direction, axis=1, keepdims=True)
+        perp = np.column_stack([-unit[:, 1], unit[:, 0]]) # Perpendicular direction
+        half_width = 0.5 / 2 # Path width is 0.5
+        paths = np.stack([self._conn_src + perp * half_width, self._conn_src - perp * half_width,
+                          self._conn_tgt - perp * half_width, self._conn_tgt + perp * half_width], axis=1)
+        ax.add_collection(PolyCollection(paths, closed=True, facecolors='#333333', edgecolors='none',
+                                         alpha=0.5, zorder=0), autolim=False)
+        
+        # Add arrows to show direction: a 0.8 long shaft centered on each path plus
+        # the two strokes of an open arrowhead, all as one collection
+        mid = (self._conn_src + self._conn_tgt) / 2
+        tail = mid - unit * 0.4
+        tip = mid + unit * 0.4
+        head_back = tip - unit * 0.2
+        segments = np.concatenate([np.stack([tail, tip], axis=1),
+                                   np.stack([tip, head_back + perp * 0.1], axis=1),
+                                   np.stack([tip, head_back - perp * 0.1], axis=1)])
+        ax.add_collection(LineCollection(segments, colors='white', linewidths=2, alpha=0.8,
+                                         capstyle='round', zorder=1), autolim=False)
             
         # Draw modules outlines and create dynamic outline patches
         for module_name, module in self.modules.items():
@@ -537,28 +657,14 @@ class NeuronOSEnhancedDemo:
 
     def update_visual_artists(self, ax_main, ax_bottom):
         """Update the properties of matplotlib artists based on simulation data."""
-        
-        # List to hold all artists that were updated or added/removed this frame
-        artists_to_update = []
 
         # --- Update Info Text ---
         info_text = f"Time: {self.current_time:.1f} | Input: {self.input_type.capitalize()}"
         self.info_text_artist.set_text(info_text)
-        artists_to_update.append(self.info_text_artist)
 
 
         # --- Update NPU colors ---
-        # The NPU patches exist permanently, we just update their color if needed
-        for module_name, module in self.modules.items():
-             for npu_id, npu in module.npus.items():
-                 patch = self.npu_patches[npu_id]
-                 new_color = npu.get_color()
-                 # Check if color actually changed before updating
-                 # Use matplotlib.colors.to_rgb for conversion
-                 if patch.get_facecolor()[0:3] != colors.to_rgb(new_color): 
-                    patch.set_facecolor(new_color)
-                 # Add the NPU patch to the list of artists to update regardless, as blit needs it
-                 artists_to_update.append(patch)
+        self.update_npu_colors()
 
 
         # --- Update Module Activity Visualization (Outline Alpha) ---
@@ -568,132 +674,78 @@ class NeuronOSEnhancedDemo:
              new_alpha = 0.2 + module.activity_level * 0.6 
              if outline_patch.get_alpha() != new_alpha:
                   outline_patch.set_alpha(new_alpha)
-             artists_to_update.append(outline_patch)
 
 
         # --- Update Active Spikes ---
-        # Remove old spike patches
-        for patch in self.spike_patches:
-            patch.remove() # Remove from axes
-        self.spike_patches = [] # Clear the list
-
-        # Add new spike patches
-        for module_name, npu_id in self.active_spikes_data:
-            npu = self.modules[module_name].npus[npu_id]
-            # Add glow effect (slightly larger, more transparent)
-            glow = plt.Circle(npu.position, npu.size * 2.5, facecolor='yellow', edgecolor='none', alpha=0.4, zorder=4)
-            ax_main.add_patch(glow)
-            self.spike_patches.append(glow)
-            artists_to_update.append(glow)
-
-            # Add spike indication (smaller, less transparent)
-            spike_circle = plt.Circle(npu.position, npu.size * 1.8, facecolor='yellow', edgecolor='white', alpha=0.9, linewidth=0.5, zorder=5)
-            ax_main.add_patch(spike_circle)
-            self.spike_patches.append(spike_circle)
-            artists_to_update.append(spike_circle)
+        # Move the spike glows and circles onto the NPUs that just fired
+        self.spike_glow_collection.set_offsets(self.active_spike_positions)
+        self.spike_collection.set_offsets(self.active_spike_positions)
 
 
         # --- Update Flow Particles ---
-        # Remove old particle patches (particles that have finished or were removed)
-        # We need to match particle data objects to their visual patches
-        # Create a mapping from particle data object identity to existing patch tuple for easier update/removal
-        particle_data_to_patch = {id(p_data_obj): (p_data_obj, p_patch, g_patch) for p_data_obj, p_patch, g_patch in self.flow_particle_patches}
-        
-        updated_flow_particle_patches = [] # This will be the new list of active patches
-
-        # Keep track of patches that need to be removed at the end
-        patches_to_remove = {patch for data, patch, glow in self.flow_particle_patches}
-        glows_to_remove = {glow for data, patch, glow in self.flow_particle_patches}
-
-        for particle_data in self.flow_particles_data:
-            particle_id = id(particle_data)
-            if particle_id in particle_data_to_patch:
-                # Particle already exists, update its patch position
-                _, p_patch, g_patch = particle_data_to_patch[particle_id] # Retrieve existing patches
-                p_patch.set_center(particle_data['position'])
-                g_patch.set_center(particle_data['position'])
-                updated_flow_particle_patches.append((particle_data, p_patch, g_patch))
-                artists_to_update.append(p_patch)
-                artists_to_update.append(g_patch)
-                # Mark these patches as *not* needing removal
-                patches_to_remove.discard(p_patch)
-                glows_to_remove.discard(g_patch)
-
-            else:
-                # This is a new particle, create patches
-                x, y = particle_data['position']
-                size = particle_data['size']
-                color = particle_data['color']
-
-                # Add glow effect for particle
-                glow = plt.Circle((x, y), size * 1.5, facecolor=color, edgecolor='none', alpha=0.3, zorder=6)
-                ax_main.add_patch(glow)
-                
-                # Add particle circle
-                circle = plt.Circle((x, y), size, facecolor=color, edgecolor='white', alpha=1.0, linewidth=0.5, zorder=7)
-                ax_main.add_patch(circle)
-
-                updated_flow_particle_patches.append((particle_data, circle, glow))
-                artists_to_update.append(circle)
-                artists_to_update.append(glow)
-                
-        # Now, remove the patches that were not updated (meaning their corresponding particle data is gone)
-        for patch in patches_to_remove:
-             patch.remove()
-        for glow in glows_to_remove:
-             glow.remove()
-
-        self.flow_particle_patches = updated_flow_particle_patches # Update the list of managed patches
+        self.update_flow_particle_artists()
 
 
         # --- Update Activity Plot ---
-        # We need to track the latest time across all histories to set x-limits
-        all_times = []
-        for module in self.modules.values():
-            if module.activity_history:
-                all_times.extend([t for t, _ in module.activity_history])
-
-        max_time = max(all_times, default=0)
-        
-        # Set x-axis limits for a sliding window showing the last 50 time units
-        window_size = 50
-        if max_time > window_size:
-             ax_bottom.set_xlim(max_time - window_size, max_time)
-        else:
-             ax_bottom.set_xlim(0, window_size) # Start from 0 if not enough history
-
+        # The newest entry holds the latest time, which the x-axis is relative to
+        max_time = self.act_x[self.act_head] if self.act_count else 0
 
+        # Unroll the ring buffers oldest first, shifting times so that now is 0
+        size = len(self.act_x)
+        order = np.arange(self.act_head + 1 - self.act_count, self.act_head + 1) % size
+        times = self.act_x[order] - max_time
         for module_name, line in self.activity_lines.items():
-            history = self.modules[module_name].activity_history
-            if history:
-                times, activities = zip(*history)
-                # Set data using absolute time for the x-axis
-                line.set_data(times, activities)
-            else:
-                line.set_data([], []) # No data
-            
-            # Add the line artist to the update list
-            artists_to_update.append(line)
-
-
-        # Ensure all artists returned are visible and on the correct axes
-        # Check if any artists are None or invalid before returning
-        # We need to include artists from BOTH ax_main and ax_bottom that were updated
-        # This requires collecting artists from both axes in the artists_to_update list.
-        # Our current approach adds them all to one list, which is correct for blitting
-        valid_artists = [art for art in artists_to_update if art is not None and art.figure is not None]
+            line.set_data(times, self.act_y[module_name][order])
 
 
-        return tuple(valid_artists) # Return a tuple for blitting
+        return tuple(self._artists) # Return a tuple for blitting
 
-    def animate(self, frame):
-        """Animation function for FuncAnimation."""
-        # Update simulation data
-        self.update_simulation_data()
+    def update_npu_colors(self):
+        """Color every NPU circle by its current state in one call."""
+        states = np.concatenate([module.state for module in self.modules.values()])
+        # Skip the update (which marks the collection stale) if no NPU changed state
+        if self._npu_drawn_states is not None and np.array_equal(states, self._npu_drawn_states):
+            return
+        self._npu_drawn_states = states
+        self.npu_collection.set_facecolor(CorticalProcessingModule._STATE_RGBA[states])
+
+    def update_flow_particle_artists(self):
+        """Place, size and color the flow particle collections from the particle arrays."""
+        particles = self.flow_particles
+        positions = particles.positions(self._conn_src, self._conn_tgt)
+        particle_colors = self._conn_rgba[particles.conn_idx] # Color based on source module
+        diameters = particles.size * 2
+        self.flow_glow_collection.set_offsets(positions)
+        self.flow_glow_collection.set_widths(diameters * 1.5)
+        self.flow_glow_collection.set_heights(diameters * 1.5)
+        self.flow_glow_collection.set_facecolor(particle_colors)
+        self.flow_particle_collection.set_offsets(positions)
+        self.flow_particle_collection.set_widths(diameters)
+        self.flow_particle_collection.set_heights(diameters)
+        self.flow_particle_collection.set_facecolor(particle_colors)
+
+    def animate(self, frame, draw=True):
+        """Advance the simulation by one frame and return the artists to redraw.
+
+        Returns () when nothing needs redrawing: with draw=False only the
+        simulation advances and the artists catch up on the next drawn frame,
+        and when nothing changed (e.g. paused) the displayed frame is current.
+        """
+        # Update simulation data; drawing costs the same however many steps ran,
+        # so several steps per frame raise simulation throughput
+        for _ in range(self.sim_steps_per_frame):
+            self.update_simulation_data()
+        if not draw:
+            return ()
+        
+        # Nothing changed (e.g. paused): the frame on screen is still current
+        if not self._dirty:
+            return ()
+        self._dirty = False
         
         # Update visual artists based on new data
-        # update_visual_artists will manage adding/removing/updating patches
-        # and will return the list of artists that were affected this frame
+        # update_visual_artists only updates existing artists and returns the
+        # fixed list of artists to blit
         return self.update_visual_artists(self.ax_main, self.ax_bottom)
         
     def toggle_simulation(self, event):
@@ -705,6 +757,7 @@ class NeuronOSEnhancedDemo:
     def update_speed(self, val):
         """Update simulation speed."""
         self.speed = val
+        self._dirty = True
 
     def set_input_type(self, label):
         """Set the input pattern type based on radio button selection."""
@@ -712,6 +765,7 @@ class NeuronOSEnhancedDemo:
         input_type_map = {'Pattern': 'pattern', 'Random': 'random', 'Pulse': 'pulse', 'None': 'none'}
         self.input_type = input_type_map.get(label, 'none') # Default to 'none' if not found
         print(f"Input type set to: {self.input_type}")
+        self._dirty = True # Info text shows the input type
         # Optional: You might want to trigger a small input burst or reset state when changing input type
 
 
@@ -724,64 +778,75 @@ class NeuronOSEnhancedDemo:
         self.current_time = 0
         # Activity history is stored within the module objects
         self.active_spikes_data = []
-        self.flow_particles_data = []
+        self.active_spike_positions = np.empty((0, 2))
+        self.flow_particles.clear()
         
         # Reset modules' internal state
         for module_name, module in self.modules.items():
-            module.activity_history = [] # Clear history
+            module.activity_times.clear() # Clear history
+            module.activity_values.clear()
             module.activity_level = 0.0 # Reset current level
-            for npu_id, npu in module.npus.items():
-                npu.membrane_potential = -70.0
-                npu.state = NPUState.RESTING
-                npu.spike_history = []
+            module.reset()
                 
         # --- Reset Visual Artists ---
-        # Remove dynamic patches from axes
-        for patch in self.spike_patches:
-            patch.remove()
-        self.spike_patches = [] # Clear the list
+        # Clear spike markers
+        self.spike_glow_collection.set_offsets(np.empty((0, 2)))
+        self.spike_collection.set_offsets(np.empty((0, 2)))
 
-        # Remove flow particle patches from axes
-        for particle_data_obj, p_patch, g_patch in self.flow_particle_patches:
-             p_patch.remove()
-             g_patch.remove()
-        self.flow_particle_patches = [] # Clear the list
+        # Clear flow particle markers
+        self.update_flow_particle_artists()
 
         # Reset NPU colors to resting state color
-        for module_name, module in self.modules.items():
-            for npu_id, npu in module.npus.items():
-                if npu_id in self.npu_patches:
-                     # Get the *current* resting color based on the NPU state after reset
-                     self.npu_patches[npu_id].set_facecolor(npu.get_color())
+        self.update_npu_colors()
 
         # Reset module outline alpha
         for module_name, patch in self.module_outline_patches.items():
              patch.set_alpha(0.2) # Reset to low alpha
 
         # Reset activity plot lines
+        self.act_head = -1
+        self.act_count = 0
         for module_name, line in self.activity_lines.items():
             line.set_data([], []) # Clear data
-        self.ax_bottom.set_xlim(0, 50) # Reset x-limit view for the fixed window
 
 
         # Reset info text
         self.info_text_artist.set_text("")
 
         # Force a full redraw after resetting artists
-        # FuncAnimation might be paused, so draw_idle is necessary
+        self._dirty = True
         self.fig.canvas.draw_idle()
 
 
-    def run(self):
-        """Run the interactive demo."""
+    def on_draw(self, event):
+        """Cache the freshly drawn background and draw the blitted artists on top."""
+        self._background = self.fig.canvas.copy_from_bbox(self.fig.bbox)
+        self.draw_artists()
+
+    def draw_artists(self):
+        """Draw the blitted artists in z-order."""
+        for artist in sorted(self._artists, key=lambda a: a.get_zorder()):
+            self.fig.draw_artist(artist)
+
+    def blit_frame(self):
+        """Redraw the blitted artists over the cached background."""
+        if self._background is None:
+            return
+        canvas = self.fig.canvas
+        canvas.restore_region(self._background)
+        self.draw_artists()
+        # The artists span both axes, so blit the whole figure
+        canvas.blit(self.fig.bbox)
+
+    def run(self, frame_interval=0.03):
+        """Run the interactive demo.
+
+        Args:
+            frame_interval: Target time between frames in seconds (0.03 is roughly
+                33 frames per second).
+        """
         # Set up visualization
         fig = self.setup_visualization()
-        
-        # Create animation
-        # blit=True helps performance by only redrawing the artists that change
-        # We need to return *all* artists that change in animate()
-        # Using interval=30 (30ms) means roughly 33 frames per second
-        self.ani = FuncAnimation(fig, self.animate, frames=None, interval=30, blit=True) 
 
         print("Starting NeuronOS Enhanced Demo...")
         print("This demo shows how the NeuronOS architecture processes information through specialized neural modules.")
@@ -800,9 +865,34 @@ class NeuronOSEnhancedDemo:
         print("- Input Type: Change the pattern of input signals to the Sensory module")
         print("\nIMPORTANT: Click the 'Start' button to begin the simulation!")
 
-        # Show plot
-        # plt.tight_layout() # Might interfere with custom positioning - Keep commented
-        plt.show()
+        # Non-interactive backends have no window to drive, just render once
+        if fig.canvas.required_interactive_framework is None:
+            plt.show()
+            return
+
+        # Drive rendering directly instead of through matplotlib.animation:
+        # restore the cached background, redraw the known artists and blit
+        # When drawn frames overrun the budget, every other frame only advances
+        # the simulation, so it keeps its pace while the display drops frames
+        plt.show(block=False)
+        fig.canvas.draw()
+        draw_time = 0.0 # Moving average of a drawn frame's duration
+        skip_draw = False
+        while plt.fignum_exists(fig.number):
+            frame_start = time.perf_counter()
+            if skip_draw:
+                self.animate(None, draw=False)
+                skip_draw = False
+            else:
+                # Blit only frames that changed, so a paused demo stays idle
+                if self.animate(None):
+                    self.blit_frame()
+                draw_time = 0.9 * draw_time + 0.1 * (time.perf_counter() - frame_start)
+                skip_draw = draw_time > 1.5 * frame_interval
+            fig.canvas.flush_events() # Handle widget and window events
+            remaining = frame_interval - (time.perf_counter() - frame_start)
+            if remaining > 0:
+                time.sleep(remaining)
 
 # Run the demo if executed directly
 if __name__ == "__main__":
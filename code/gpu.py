@@ -0,0 +1,26 @@
+# Optional CuPy (CUDA) support
+
+"""
+CuPy is an optional dependency of NeuronOS. When it is installed, modules
+and populations created with ``device='cuda'`` run their large array
+operations on the GPU; otherwise only the CPU device is available.
+"""
+
+try:
+    import cupy
+    import cupyx.scipy.sparse as cupy_sparse
+    CUPY_AVAILABLE = True
+except ImportError:
+    cupy = None
+    cupy_sparse = None
+    CUPY_AVAILABLE = False
+
+DEVICES = ('cpu', 'cuda')
+
+
+def check_device(device):
+    """Validate a device name, raising ValueError if it cannot be used."""
+    if device not in DEVICES:
+        raise ValueError(f"Unknown device {device!r}; expected one of {DEVICES}")
+    if device == 'cuda' and not CUPY_AVAILABLE:
+        raise ValueError("device='cuda' requires CuPy to be installed")
@@ -0,0 +1,20 @@
+# Optional Numba JIT support
+
+"""
+Numba is an optional dependency of NeuronOS. When it is installed the
+numeric kernels are compiled with ``njit``; otherwise ``njit`` leaves the
+function untouched and callers should take their NumPy code path instead.
+"""
+
+try:
+    from numba import njit, prange
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+    prange = range
+
+    def njit(*args, **kwargs):
+        """Stand-in for numba.njit that returns the function uncompiled."""
+        if len(args) == 1 and callable(args[0]) and not kwargs:
+            return args[0]
+        return lambda func: func
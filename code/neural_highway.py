@@ -1,6 +1,16 @@
 import numpy as np
-import heapq
-from collections import defaultdict
+import math
+import itertools
+from collections import defaultdict, deque, Counter
+
+# Spikes are queued in priority buckets: BUCKETS_PER_OCTAVE buckets per doubling of
+# priority, with priority 1.0 in the middle bucket and lower indices more urgent
+QUEUE_BUCKETS = 64
+BUCKETS_PER_OCTAVE = 4
+
+# Bounds on the traffic statistics, which would otherwise grow every time step
+TRAFFIC_HISTORY_LENGTH = 1024
+MAX_CONGESTION_POINTS = 1024
 
 class NeuralHighway:
     """
@@ -21,16 +31,23 @@ class NeuralHighway:
         
         # Connection topology
         self.connections = defaultdict(list)  # Maps source_id to list of (target_id, priority) tuples
+        self._conn_priority = {}  # Maps (source_id, target_id) to base priority, mirrors connections
+        self._adj = {}  # Maps source_id to {target_id: indices of its entries in connections[source_id]}
+        self._route_cache = {}  # Maps (source_id, target_id) to its route tuple (or None)
         
-        # Transmission queue (priority queue for spike routing)
-        self.transmission_queue = []  # Heap of (priority, timestamp, source_id, target_id, spike_data) tuples
+        # Transmission queue (bucketed priority queue for spike routing)
+        # Each bucket is a FIFO of (timestamp, source_id, target_id, spike_data) tuples
+        self.transmission_queue = [deque() for _ in range(QUEUE_BUCKETS)]
+        self.queue_size = 0  # Number of spikes waiting in the queue
+        self._pending = Counter()  # Maps (source_id, target_id) to its number of queued spikes
         
         # Traffic statistics
-        self.traffic_history = []
-        self.congestion_points = defaultdict(int)
+        self.traffic_history = deque(maxlen=TRAFFIC_HISTORY_LENGTH)  # (time, queue size), oldest dropped first
+        self.congestion_points = Counter()  # Maps (source_id, target_id) to its congestion count
         
         # Adaptive routing parameters
-        self.route_strength = defaultdict(lambda: defaultdict(float))  # Maps (source, target) to strength
+        self.module_index = {}  # Maps module ID to its row/column in route_strength
+        self.route_strength = np.zeros((0, 0))  # route_strength[source, target] by module index
         self.learning_rate = 0.01
         
     def add_connection(self, source_id, target_id, priority=1.0):
@@ -42,7 +59,18 @@ class NeuralHighway:
             target_id: ID of the target module
             priority: Base priority for this connection (higher values = higher priority)
         """
+        self._adj.setdefault(source_id, {}).setdefault(target_id, []).append(len(self.connections[source_id]))
         self.connections[source_id].append((target_id, priority))
+        self._conn_priority.setdefault((source_id, target_id), priority)
+        self._route_cache.clear()  # Topology changed
+        
+        # Give new modules a row and column in the route strength matrix
+        for module_id in (source_id, target_id):
+            if module_id not in self.module_index:
+                self.module_index[module_id] = len(self.module_index)
+        grow = len(self.module_index) - len(self.route_strength)
+        if grow:
+            self.route_strength = np.pad(self.route_strength, ((0, grow), (0, grow)))
         
     def transmit_spike(self, source_id, target_id, spike_data, timestamp, urgency=1.0, importance=1.0):
         """
@@ -60,17 +88,66 @@ class NeuralHighway:
             True if spike was queued, False if connection doesn't exist
         """
         # Check if connection exists
-        if not any(t[0] == target_id for t in self.connections[source_id]):
+        base_priority = self._conn_priority.get((source_id, target_id))
+        if base_priority is None:
             return False
             
         # Calculate priority based on base priority, urgency, and importance
-        base_priority = next(p for t, p in self.connections[source_id] if t == target_id)
         priority = base_priority * urgency * importance
         
-        # Add to transmission queue (negative priority because heapq is a min-heap)
-        heapq.heappush(self.transmission_queue, (-priority, timestamp, source_id, target_id, spike_data))
+        # Add to transmission queue
+        self.transmission_queue[self._bucket(priority)].append((timestamp, source_id, target_id, spike_data))
+        self.queue_size += 1
+        self._pending[(source_id, target_id)] += 1
         return True
         
+    def transmit_spikes(self, source_id, target_ids, spike_data, timestamps, urgency=1.0, importance=1.0):
+        """
+        Queue a batch of spikes from one source to each of several targets.
+        
+        Equivalent to calling transmit_spike for every spike and then every
+        target, in that order, but looks up each route's priority only once.
+        
+        Args:
+            source_id: ID of the source module
+            target_ids: IDs of the target modules
+            spike_data: Data payload of each spike
+            timestamps: Simulation time of each spike
+            urgency: Time sensitivity factor (higher = more urgent)
+            importance: Relevance factor (higher = more important)
+            
+        Returns:
+            Number of spikes queued (spikes to unconnected targets are dropped)
+        """
+        # Resolve the queue bucket of each connected target once
+        routes = []
+        for target_id in target_ids:
+            base_priority = self._conn_priority.get((source_id, target_id))
+            if base_priority is not None:
+                bucket = self.transmission_queue[self._bucket(base_priority * urgency * importance)]
+                routes.append((target_id, bucket.append))
+        if not routes:
+            return 0
+            
+        # Add to transmission queue, spike-major like repeated transmit_spike calls
+        count = 0
+        for data, timestamp in zip(spike_data, timestamps):
+            for target_id, append in routes:
+                append((timestamp, source_id, target_id, data))
+            count += 1
+        
+        self.queue_size += count * len(routes)
+        for target_id, _ in routes:
+            self._pending[(source_id, target_id)] += count
+        return count * len(routes)
+        
+    def _bucket(self, priority):
+        """Get the queue bucket for a priority (higher priority = lower index)."""
+        if priority <= 0:
+            return QUEUE_BUCKETS - 1
+        bucket = QUEUE_BUCKETS // 2 + math.floor(-BUCKETS_PER_OCTAVE * math.log2(priority))
+        return min(QUEUE_BUCKETS - 1, max(0, bucket))
+        
     def update(self, current_time, time_step):
         """
         Process the transmission queue for the current time step.
@@ -86,35 +163,49 @@ class NeuralHighway:
         available_bandwidth = self.bandwidth
         
         # Track traffic for this time step
-        queue_size = len(self.transmission_queue)
-        self.traffic_history.append((current_time, queue_size))
+        self.traffic_history.append((current_time, self.queue_size))
         
-        # Process queue up to bandwidth limit
+        # Process queue up to bandwidth limit, highest priority bucket first
         delivered_spikes = []
-        congestion = defaultdict(int)
+        delivered_routes = Counter()
+        pending = self._pending
         
-        while self.transmission_queue and available_bandwidth > 0:
-            # Pop highest priority spike
-            neg_priority, timestamp, source_id, target_id, spike_data = heapq.heappop(self.transmission_queue)
-            priority = -neg_priority
-            
-            # Check if spike is still relevant (not too old)
-            if current_time - timestamp > 50.0:  # Discard spikes older than 50ms
-                continue
+        for bucket in self.transmission_queue:
+            while bucket and available_bandwidth > 0:
+                # Pop as many spikes as there is bandwidth left; stale spikes don't
+                # use bandwidth, so repeat until it is spent or the bucket is empty
+                if len(bucket) <= available_bandwidth:
+                    batch = list(bucket)
+                    bucket.clear()
+                else:
+                    batch = [bucket.popleft() for _ in range(available_bandwidth)]
+                self.queue_size -= len(batch)
+                pending.subtract([(source_id, target_id) for _, source_id, target_id, _ in batch])
                 
-            # Deliver the spike
-            delivered_spikes.append((target_id, source_id, spike_data))
-            available_bandwidth -= 1
-            
-            # Strengthen this route based on successful transmission
-            self.route_strength[source_id][target_id] += self.learning_rate
+                # Deliver the spikes that are still relevant (discard spikes older than 50ms)
+                fresh = [(target_id, source_id, spike_data)
+                         for timestamp, source_id, target_id, spike_data in batch
+                         if current_time - timestamp <= 50.0]
+                delivered_spikes.extend(fresh)
+                available_bandwidth -= len(fresh)
+                delivered_routes.update([(source_id, target_id) for target_id, source_id, _ in fresh])
+            if available_bandwidth == 0:
+                break
+                
+        # Strengthen the routes based on successful transmissions, all in one update
+        if delivered_routes:
+            sources = [self.module_index[source_id] for source_id, _ in delivered_routes]
+            targets = [self.module_index[target_id] for _, target_id in delivered_routes]
+            counts = np.fromiter(delivered_routes.values(), dtype=np.float64, count=len(delivered_routes))
+            self.route_strength[sources, targets] += self.learning_rate * counts
+        self._pending = pending = +pending  # Drop routes with nothing left in the queue
             
-        # If we still have spikes in the queue, record congestion
-        if self.transmission_queue:
-            for _, _, source_id, target_id, _ in self.transmission_queue:
-                congestion_key = f"{source_id}->{target_id}"
-                congestion[congestion_key] += 1
-                self.congestion_points[congestion_key] += 1
+        # If we still have spikes in the queue, record congestion from the
+        # per-route counts instead of rescanning the queue
+        self.congestion_points.update(pending)
+        if len(self.congestion_points) > 2 * MAX_CONGESTION_POINTS:
+            # Keep only the most congested routes
+            self.congestion_points = Counter(dict(self.congestion_points.most_common(MAX_CONGESTION_POINTS)))
                 
         return delivered_spikes
         
@@ -129,27 +220,36 @@ class NeuralHighway:
         Returns:
             List of module IDs representing the optimal route, or None if no route exists
         """
+        # Routes only depend on the topology, so they are cached until a connection is added
+        key = (source_id, target_id)
+        if key not in self._route_cache:
+            self._route_cache[key] = self._find_route(source_id, target_id)
+        route = self._route_cache[key]
+        return list(route) if route is not None else None
+        
+    def _find_route(self, source_id, target_id):
+        """Find the shortest route from source to target as a tuple, or None."""
         # This is a simplified implementation - in a full system, this would use
         # a more sophisticated routing algorithm like Dijkstra's
         
         # Check direct connection
-        if any(t[0] == target_id for t in self.connections[source_id]):
-            return [source_id, target_id]
+        if (source_id, target_id) in self._conn_priority:
+            return (source_id, target_id)
             
         # Simple breadth-first search for a route
         visited = set([source_id])
-        queue = [(source_id, [source_id])]
+        queue = deque([(source_id, (source_id,))])
         
         while queue:
-            current, path = queue.pop(0)
+            current, path = queue.popleft()
             
-            for next_id, _ in self.connections[current]:
+            for next_id, _ in self.connections.get(current, ()):
                 if next_id == target_id:
-                    return path + [next_id]
+                    return path + (next_id,)
                     
                 if next_id not in visited:
                     visited.add(next_id)
-                    queue.append((next_id, path + [next_id]))
+                    queue.append((next_id, path + (next_id,)))
                     
         return None  # No route found
         
@@ -159,37 +259,36 @@ class NeuralHighway:
             return 0.0
             
         # Return average queue size over recent history as percentage of bandwidth
-        recent_traffic = [traffic for _, traffic in self.traffic_history[-10:]]
+        recent_traffic = [traffic for _, traffic in itertools.islice(reversed(self.traffic_history), 10)]
         avg_traffic = sum(recent_traffic) / len(recent_traffic) if recent_traffic else 0
         return min(1.0, avg_traffic / self.bandwidth)
         
     def optimize_routing(self):
         """Optimize routing based on traffic patterns and congestion."""
         # Identify most congested routes
-        congested_routes = sorted(self.congestion_points.items(), 
-                                 key=lambda x: x[1], 
-                                 reverse=True)[:5]
+        congested_routes = self.congestion_points.most_common(5)
                                  
         # For each congested route, try to find alternative paths
-        for route, _ in congested_routes:
-            source_id, target_id = route.split('->')
+        for (source_id, target_id), _ in congested_routes:
             
-            # Find all possible intermediate nodes
+            # Find all possible intermediate nodes: the source's targets that
+            # connect on to the target
             intermediate_candidates = []
-            for mid in self.connections:
-                # Check if we can go from source to mid and from mid to target
+            for mid in self._adj.get(source_id, ()):
                 if (mid != source_id and mid != target_id and
-                    any(t[0] == mid for t in self.connections[source_id]) and
-                    any(t[0] == target_id for t in self.connections[mid])):
+                    target_id in self._adj.get(mid, ())):
                     intermediate_candidates.append(mid)
                     
             # If we found alternatives, strengthen those routes
             for mid in intermediate_candidates:
                 # Increase priority for the alternative route
-                for i, (target, priority) in enumerate(self.connections[source_id]):
-                    if target == mid:
-                        self.connections[source_id][i] = (target, priority * 1.1)
-                        
-                for i, (target, priority) in enumerate(self.connections[mid]):
-                    if target == target_id:
-                        self.connections[mid][i] = (target, priority * 1.1)
+                self._scale_priority(source_id, mid, 1.1)
+                self._scale_priority(mid, target_id, 1.1)
+                
+    def _scale_priority(self, source_id, target_id, factor):
+        """Multiply the priority of every source -> target connection by factor."""
+        connections = self.connections[source_id]
+        for i in self._adj[source_id][target_id]:
+            target, priority = connections[i]
+            connections[i] = (target, priority * factor)
+        self._conn_priority[(source_id, target_id)] *= factor
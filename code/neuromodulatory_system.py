@@ -1,6 +1,5 @@
 import numpy as np
 from enum import Enum
-from collections import defaultdict
 
 class ModulationType(Enum):
     ATTENTION = 0
@@ -8,6 +7,39 @@ class ModulationType(Enum):
     HOMEOSTATIC = 2
     PLASTICITY = 3
 
+class ModulationFactors(list):
+    """
+    The four modulation factors of one module, stored in ModulationType.value
+    order and indexed by either a ModulationType or its value. Membership, keys,
+    values, items and get treat it as a mapping from ModulationType to factor,
+    like the dict this replaces; iteration and len stay those of the list.
+    """
+    __slots__ = ()
+    
+    def __getitem__(self, key):
+        if isinstance(key, ModulationType):
+            key = key.value
+        return list.__getitem__(self, key)
+    
+    def __contains__(self, key):
+        return isinstance(key, ModulationType)
+    
+    def get(self, key, default=None):
+        """Get the factor of a ModulationType, or default for any other key."""
+        return list.__getitem__(self, key.value) if isinstance(key, ModulationType) else default
+    
+    def keys(self):
+        """Iterate over the ModulationTypes, in factor order."""
+        return iter(ModulationType)
+    
+    def values(self):
+        """Iterate over the factors."""
+        return list.__iter__(self)
+    
+    def items(self):
+        """Iterate over (ModulationType, factor) pairs."""
+        return zip(ModulationType, self)
+
 class NeuromodulatorySystem:
     """
     Implementation of the Neuromodulatory System that regulates global system states
@@ -23,15 +55,19 @@ class NeuromodulatorySystem:
         self.homeostatic_target = 0.2  # Target activity level (0.0-1.0)
         self.plasticity_rate = 0.5  # Global learning rate (0.0-1.0)
         
-        # Module-specific modulation
-        self.module_attention = defaultdict(lambda: 0.5)  # Maps module_id to attention level
-        self.module_reward = defaultdict(lambda: 0.0)     # Maps module_id to reward signal
-        self.module_homeostasis = defaultdict(lambda: 0.2)  # Maps module_id to homeostatic target
-        self.module_plasticity = defaultdict(lambda: 0.5)   # Maps module_id to plasticity rate
+        # Module-specific modulation as parallel arrays, indexed by each module's slot
+        self._idx = {}  # Maps module_id to its slot in the arrays below
+        self.module_attention = np.empty(0)    # Attention level per module
+        self.module_reward = np.empty(0)       # Reward signal per module
+        self.module_homeostasis = np.empty(0)  # Homeostatic target per module
+        self.module_plasticity = np.empty(0)   # Plasticity rate per module
         
         # Activity tracking
-        self.module_activity = defaultdict(lambda: 0.0)   # Maps module_id to current activity level
+        self.module_activity = np.empty(0)     # Current activity level per module
+        self._tracked = np.empty(0, dtype=bool)  # Whether a module's activity has been reported
         self.system_activity = 0.0  # Overall system activity level
+        self._mod_cache = {}  # Maps module_id to its ModulationFactors, reused across updates
+        self.modulation = np.empty((0, len(ModulationType)))  # Latest factors, one row per updated module
         
         # History tracking
         self.attention_history = []
@@ -53,15 +89,20 @@ class NeuromodulatorySystem:
             module_activities: Dictionary mapping module_id to activity level (0.0-1.0)
             
         Returns:
-            Dictionary mapping module_id to dictionary of modulation factors
+            Dictionary mapping module_id to its ModulationFactors. Each ModulationFactors
+            is a list subclass, not a dict: it supports [], in, get, keys, values and
+            items with ModulationType keys, but iterates over its factors. The dictionary
+            and its factors are reused and overwritten by the next update.
         """
         # Update activity tracking
-        for module_id, activity in module_activities.items():
-            self.module_activity[module_id] = activity
+        slots = self._slots(module_activities)
+        activity = np.fromiter(module_activities.values(), dtype=np.float64, count=len(slots))
+        self.module_activity[slots] = activity
+        self._tracked[slots] = True
             
         # Calculate system-wide activity
         if module_activities:
-            self.system_activity = sum(module_activities.values()) / len(module_activities)
+            self.system_activity = activity.sum() / len(activity)
         
         # Apply temporal dynamics
         self.attention_level *= self.attention_decay
@@ -76,15 +117,18 @@ class NeuromodulatorySystem:
         self.homeostatic_history.append((current_time, self.homeostatic_target))
         self.plasticity_history.append((current_time, self.plasticity_rate))
         
-        # Generate modulation factors for each module
-        modulation_factors = {}
-        for module_id in module_activities.keys():
-            modulation_factors[module_id] = {
-                ModulationType.ATTENTION: self._get_attention_modulation(module_id),
-                ModulationType.REWARD: self._get_reward_modulation(module_id),
-                ModulationType.HOMEOSTATIC: self._get_homeostatic_modulation(module_id),
-                ModulationType.PLASTICITY: self._get_plasticity_modulation(module_id)
-            }
+        # Generate modulation factors for each module, overwriting the cached ones
+        # self.modulation keeps them as an array: rows in module_activities order,
+        # columns in ModulationType.value order
+        self.modulation = np.column_stack(self._get_modulation(slots))
+        rows = self.modulation.tolist()
+        modulation_factors = self._mod_cache
+        if modulation_factors.keys() != module_activities.keys():
+            modulation_factors = {module_id: modulation_factors.get(module_id) or ModulationFactors([1.0] * 4)
+                                  for module_id in module_activities}
+            self._mod_cache = modulation_factors
+        for module_id, row in zip(module_activities, rows):
+            modulation_factors[module_id][:] = row
             
         return modulation_factors
         
@@ -96,12 +140,11 @@ class NeuromodulatorySystem:
             focus_areas: Dictionary mapping module_id to attention level (0.0-1.0)
         """
         # Reset all module attention to base level
-        for module_id in self.module_attention:
-            self.module_attention[module_id] = 0.2  # Low base attention
+        self.module_attention[:] = 0.2  # Low base attention
             
         # Apply focused attention
-        for module_id, attention in focus_areas.items():
-            self.module_attention[module_id] = min(1.0, max(0.0, attention))
+        slots = self._slots(focus_areas)
+        self.module_attention[slots] = np.clip(list(focus_areas.values()), 0.0, 1.0)
             
         # Update global attention level
         if focus_areas:
@@ -120,12 +163,10 @@ class NeuromodulatorySystem:
         
         if target_modules:
             # Apply reward to specific modules
-            for module_id in target_modules:
-                self.module_reward[module_id] = self.reward_signal
+            self.module_reward[self._slots(target_modules)] = self.reward_signal
         else:
             # Apply reward system-wide
-            for module_id in self.module_reward:
-                self.module_reward[module_id] = self.reward_signal
+            self.module_reward[:] = self.reward_signal
                 
     def adjust_plasticity(self, plasticity_rate, target_modules=None):
         """
@@ -140,12 +181,10 @@ class NeuromodulatorySystem:
         
         if target_modules:
             # Apply to specific modules
-            for module_id in target_modules:
-                self.module_plasticity[module_id] = self.plasticity_rate
+            self.module_plasticity[self._slots(target_modules)] = self.plasticity_rate
         else:
             # Apply system-wide
-            for module_id in self.module_plasticity:
-                self.module_plasticity[module_id] = self.plasticity_rate
+            self.module_plasticity[:] = self.plasticity_rate
                 
     def set_homeostatic_target(self, target_activity, target_modules=None):
         """
@@ -160,60 +199,78 @@ class NeuromodulatorySystem:
         
         if target_modules:
             # Apply to specific modules
-            for module_id in target_modules:
-                self.module_homeostasis[module_id] = self.homeostatic_target
+            self.module_homeostasis[self._slots(target_modules)] = self.homeostatic_target
         else:
             # Apply system-wide
-            for module_id in self.module_homeostasis:
-                self.module_homeostasis[module_id] = self.homeostatic_target
+            self.module_homeostasis[:] = self.homeostatic_target
     
-    def _apply_homeostatic_regulation(self):
-        """Apply homeostatic regulation based on current activity levels."""
-        for module_id, activity in self.module_activity.items():
-            target = self.module_homeostasis[module_id]
-            
-            # Calculate activity error
-            error = activity - target
+    def _slots(self, module_ids):
+        """
+        Get the array slot of each module, registering modules not seen before.
+        
+        Args:
+            module_ids: Iterable of module_ids
             
-            # Adjust module-specific plasticity based on error
-            if abs(error) > 0.1:  # Only adjust if error is significant
-                # Increase plasticity when activity is too low
-                if error < 0:
-                    self.module_plasticity[module_id] = min(1.0, self.module_plasticity[module_id] * 1.1)
-                # Decrease plasticity when activity is too high
-                else:
-                    self.module_plasticity[module_id] = max(0.1, self.module_plasticity[module_id] * 0.9)
+        Returns:
+            Integer array of slots, in the order of module_ids
+        """
+        slots = []
+        for module_id in module_ids:
+            slot = self._idx.get(module_id)
+            if slot is None:
+                slot = self._register(module_id)
+            slots.append(slot)
+        return np.array(slots, dtype=np.intp)
     
-    def _get_attention_modulation(self, module_id):
-        """Get the attention modulation factor for a specific module."""
-        # Combine global and module-specific attention
-        return 0.3 * self.attention_level + 0.7 * self.module_attention[module_id]
+    def _register(self, module_id):
+        """Give a new module a slot, with default modulation values."""
+        slot = len(self._idx)
+        self._idx[module_id] = slot
+        self.module_attention = np.append(self.module_attention, 0.5)
+        self.module_reward = np.append(self.module_reward, 0.0)
+        self.module_homeostasis = np.append(self.module_homeostasis, 0.2)
+        self.module_plasticity = np.append(self.module_plasticity, 0.5)
+        self.module_activity = np.append(self.module_activity, 0.0)
+        self._tracked = np.append(self._tracked, False)
+        return slot
     
-    def _get_reward_modulation(self, module_id):
-        """Get the reward modulation factor for a specific module."""
-        # Combine global and module-specific reward
-        base_reward = 0.3 * self.reward_signal + 0.7 * self.module_reward[module_id]
+    def _apply_homeostatic_regulation(self):
+        """Apply homeostatic regulation based on current activity levels."""
+        # Calculate activity error; only adjust modules whose error is significant
+        error = self.module_activity - self.module_homeostasis
+        significant = self._tracked & (np.abs(error) > 0.1)
+        too_low = significant & (error < 0)
+        too_high = significant & ~too_low
         
-        # Convert from -1,1 range to 0,2 range (1.0 is neutral)
-        return base_reward + 1.0
-    
-    def _get_homeostatic_modulation(self, module_id):
-        """Get the homeostatic modulation factor for a specific module."""
-        activity = self.module_activity[module_id]
-        target = self.module_homeostasis[module_id]
-        
-        # Calculate modulation factor based on activity error
-        error = activity - target
-        
-        # Generate modulation factor (1.0 is neutral)
-        if error < 0:
-            # Activity too low - increase excitability
-            return 1.0 + min(0.5, abs(error))
-        else:
-            # Activity too high - decrease excitability
-            return 1.0 - min(0.5, error)
+        # Increase plasticity (up to 1.0) when activity is too low and decrease it
+        # (down to 0.1) when too high, as one scale and clip over all modules
+        plasticity = self.module_plasticity
+        plasticity *= np.where(too_low, 1.1, np.where(too_high, 0.9, 1.0))
+        np.clip(plasticity, np.where(too_high, 0.1, -np.inf), np.where(too_low, 1.0, np.inf),
+                out=plasticity)
     
-    def _get_plasticity_modulation(self, module_id):
-        """Get the plasticity modulation factor for a specific module."""
+    def _get_modulation(self, slots):
+        """
+        Get the modulation factors of the modules in the given slots.
+        
+        Args:
+            slots: Integer array of module slots
+            
+        Returns:
+            Tuple of (attention, reward, homeostatic, plasticity) factor arrays
+        """
+        # Combine global and module-specific attention
+        attention = 0.3 * self.attention_level + 0.7 * self.module_attention[slots]
+        
+        # Combine global and module-specific reward, converted from the -1,1
+        # range to the 0,2 range (1.0 is neutral)
+        reward = 0.3 * self.reward_signal + 0.7 * self.module_reward[slots] + 1.0
+        
+        # Activity too low increases excitability, too high decreases it (1.0 is neutral)
+        error = self.module_activity[slots] - self.module_homeostasis[slots]
+        homeostatic = 1.0 - np.clip(error, -0.5, 0.5)
+        
         # Combine global and module-specific plasticity
-        return 0.3 * self.plasticity_rate + 0.7 * self.module_plasticity[module_id]
+        plasticity = 0.3 * self.plasticity_rate + 0.7 * self.module_plasticity[slots]
+        
+        return attention, reward, homeostatic, plasticity
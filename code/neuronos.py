@@ -1,13 +1,22 @@
 import numpy as np
+import os
 import time
+import weakref
 from enum import Enum
 from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 
 # Import NeuronOS components
 from npu import NeuralProcessingUnit, NPUState
-from cpm import CorticalProcessingModule, CPMType
+from cpm import CorticalProcessingModule, CPMType, compute_all_activities
 from neural_highway import NeuralHighway
 from neuromodulatory_system import NeuromodulatorySystem, ModulationType
+from jit import NUMBA_AVAILABLE
+
+# Columns of NeuromodulatorySystem.modulation
+_ATTENTION = ModulationType.ATTENTION.value
+_REWARD = ModulationType.REWARD.value
+_HOMEOSTATIC = ModulationType.HOMEOSTATIC.value
 
 class NeuronOS:
     """
@@ -29,18 +38,41 @@ class NeuronOS:
         self.current_time = 0.0
         self.time_step = self.config.get('time_step', 1.0)  # ms
         
-        # Initialize components
+        # Initialize components; the CPM connection table only depends on the
+        # configuration, so it is built once and kept across resets
+        self._build_connection_table()
         self._initialize_components()
         
         # System state
         self.running = False
-        self.execution_history = []
+        self._allocate_history(0)
+        
+        # CPMs receiving highway spikes are processed in parallel threads when the
+        # compiled kernels (which release the GIL) are available
+        max_workers = self.config.get('max_workers') or os.cpu_count() or 1
+        self._executor = ThreadPoolExecutor(max_workers) if NUMBA_AVAILABLE and max_workers > 1 else None
+        
+        # Worker threads are shut down by close(), or when the system is garbage collected
+        self._shutdown_executor = weakref.finalize(self, self._executor.shutdown) if self._executor else None
+        
+    def close(self):
+        """Shut down the worker threads; later steps process CPMs serially."""
+        if self._shutdown_executor is not None:
+            self._shutdown_executor()
+        self._executor = None
+        
+    def __enter__(self):
+        return self
+        
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
         
     def _get_default_config(self):
         """Get default configuration for NeuronOS."""
         return {
             'time_step': 1.0,  # ms
             'simulation_duration': 1000.0,  # ms
+            'max_workers': None,  # Threads for processing CPMs in parallel (None = CPU count)
             'cpm_config': {
                 'sensory': {'count': 1, 'input_size': 100, 'hidden_size': 500, 'output_size': 50},
                 'temporal': {'count': 1, 'input_size': 50, 'hidden_size': 200, 'output_size': 30},
@@ -54,6 +86,44 @@ class NeuronOS:
             }
         }
         
+    def _build_connection_table(self):
+        """Build the static table of CPM IDs, types and highway connections."""
+        self._cpm_ids = []
+        cpm_types = []
+        for cpm_type_name, config in self.config['cpm_config'].items():
+            cpm_type = CPMType[cpm_type_name.upper()]
+            for i in range(config['count']):
+                self._cpm_ids.append(f"{cpm_type_name}_{i}")
+                cpm_types.append(cpm_type.value)
+        self._cpm_types = np.array(cpm_types, dtype=np.int8)
+        self._cpm_index = {cpm_id: index for index, cpm_id in enumerate(self._cpm_ids)}
+        self._is_sensory = self._cpm_types == CPMType.SENSORY.value
+        self._is_executive = self._cpm_types == CPMType.EXECUTIVE.value
+        self._sensory_cpm_ids = [cpm_id for cpm_id, sensory in zip(self._cpm_ids, self._is_sensory) if sensory]
+        self._executive_cpm_ids = [cpm_id for cpm_id, executive in zip(self._cpm_ids, self._is_executive) if executive]
+        self._output_size = self.config['cpm_config'].get('executive', {}).get('output_size', 0)
+        
+        # Every CPM connects to every other CPM, in source-major order
+        count = len(self._cpm_ids)
+        conn_src, conn_dst = np.nonzero(~np.eye(count, dtype=bool))
+        self._conn_src = conn_src.astype(np.int32)
+        self._conn_dst = conn_dst.astype(np.int32)
+        
+        # Different connection priorities based on CPM types: higher priority for
+        # executive module connections, and for sensory to processing connections
+        executive = self._is_executive
+        sensory = self._is_sensory
+        processing = np.isin(self._cpm_types, [CPMType.TEMPORAL.value, CPMType.SPATIAL.value,
+                                               CPMType.LINGUISTIC.value])
+        self._conn_priority = np.ones(len(conn_src))
+        self._conn_priority[executive[conn_src] | executive[conn_dst]] = 1.5
+        self._conn_priority[sensory[conn_src] & processing[conn_dst]] = 1.3
+        
+        # Target IDs of each source CPM, for spike transmission
+        self._targets_of = {cpm_id: [] for cpm_id in self._cpm_ids}
+        for source, target in zip(conn_src.tolist(), conn_dst.tolist()):
+            self._targets_of[self._cpm_ids[source]].append(self._cpm_ids[target])
+        
     def _initialize_components(self):
         """Initialize all NeuronOS components based on configuration."""
         # Initialize Cortical Processing Modules
@@ -71,6 +141,7 @@ class NeuronOS:
                     config['hidden_size'],
                     config['output_size']
                 )
+        self._cpm_list = list(self.cpms.values())  # In self._cpm_ids order
         
         # Initialize Neural Highways
         self.highways = {}
@@ -82,22 +153,10 @@ class NeuronOS:
             self.config['highway_config']['bandwidth']
         )
         
-        # Connect CPMs to the main highway
-        for source_id in self.cpms:
-            for target_id in self.cpms:
-                if source_id != target_id:
-                    # Different connection priorities based on CPM types
-                    priority = 1.0
-                    
-                    # Higher priority for executive module connections
-                    if "executive" in source_id or "executive" in target_id:
-                        priority = 1.5
-                        
-                    # Higher priority for sensory to processing connections
-                    if "sensory" in source_id and any(t in target_id for t in ["temporal", "spatial", "linguistic"]):
-                        priority = 1.3
-                        
-                    self.highways[main_highway_id].add_connection(source_id, target_id, priority)
+        # Connect CPMs to the main highway from the precomputed connection table
+        for source, target, priority in zip(self._conn_src.tolist(), self._conn_dst.tolist(),
+                                            self._conn_priority.tolist()):
+            self.highways[main_highway_id].add_connection(self._cpm_ids[source], self._cpm_ids[target], priority)
         
         # Initialize Neuromodulatory System
         self.neuromodulatory_system = NeuromodulatorySystem()
@@ -120,23 +179,14 @@ class NeuronOS:
         self.input_buffer = input_data
         
         # Convert input data to spikes for sensory CPMs
+        # All inputs go to the first sensory module
+        target_cpm = self._sensory_cpm_ids[0] if self._sensory_cpm_ids else None
         sensory_spikes = {}
         for input_id, values in input_data.items():
-            # Determine which sensory module should receive this input
-            target_cpm = None
-            for cpm_id in self.cpms:
-                if "sensory" in cpm_id:
-                    target_cpm = cpm_id
-                    break
-                    
             if target_cpm:
-                # Convert values to spike indices and times
-                spikes = []
-                for i, value in enumerate(values):
-                    if value > 0.5:  # Simple threshold for spike generation
-                        spikes.append((i, self.current_time))
-                        
-                sensory_spikes[target_cpm] = spikes
+                # Convert values to (index, time) spike rows
+                indices = np.flatnonzero(np.asarray(values) > 0.5)  # Simple threshold for spike generation
+                sensory_spikes[target_cpm] = np.column_stack((indices, np.full(indices.size, self.current_time)))
         
         # Process sensory input
         cpm_outputs = {}
@@ -146,14 +196,12 @@ class NeuronOS:
             
         # Transmit spikes through Neural Highways
         for source_id, spikes in cpm_outputs.items():
-            for output_index, spike_time in spikes:
-                # Find all potential targets
-                for target_id in self.cpms:
-                    if target_id != source_id:
-                        # Transmit spike with default urgency and importance
-                        self.highways["main_highway"].transmit_spike(
-                            source_id, target_id, output_index, spike_time, 1.0, 1.0
-                        )
+            if len(spikes):
+                # Send every spike to all other CPMs with default urgency and importance
+                output_indices, spike_times = zip(*spikes)
+                self.highways["main_highway"].transmit_spikes(
+                    source_id, self._targets_of[source_id], output_indices, spike_times, 1.0, 1.0
+                )
         
         # Process highway transmissions
         delivered_spikes = {}
@@ -161,56 +209,54 @@ class NeuronOS:
             delivered = highway.update(self.current_time, self.time_step)
             delivered_spikes[highway_id] = delivered
             
-        # Deliver spikes to target CPMs
+        # Deliver spikes to target CPMs, grouped by target in delivery order
+        spikes_by_target = defaultdict(list)
         for highway_id, spikes in delivered_spikes.items():
             for target_id, source_id, spike_data in spikes:
                 if target_id in self.cpms:
-                    # Convert to input format expected by CPM
-                    cpm_input = [(int(spike_data), self.current_time)]
-                    output = self.cpms[target_id].process_input(cpm_input, self.current_time, self.time_step)
-                    
-                    # Store or update output
-                    if target_id in cpm_outputs:
-                        cpm_outputs[target_id].extend(output)
-                    else:
-                        cpm_outputs[target_id] = output
+                    spikes_by_target[target_id].append(spike_data)
+        
+        # The target CPMs are independent of each other, so they can run concurrently
+        if self._executor is not None and len(spikes_by_target) > 1:
+            outputs = self._executor.map(self._deliver_spikes, spikes_by_target.keys(), spikes_by_target.values())
+        else:
+            outputs = map(self._deliver_spikes, spikes_by_target.keys(), spikes_by_target.values())
+        for target_id, output in zip(spikes_by_target, outputs):
+            # Store or update output
+            if target_id in cpm_outputs:
+                cpm_outputs[target_id].extend(output)
+            else:
+                cpm_outputs[target_id] = output
         
         # Get activity levels for neuromodulation
-        module_activities = {}
-        for cpm_id, cpm in self.cpms.items():
-            module_activities[cpm_id] = cpm.get_activity_level()
+        activities = compute_all_activities(self._cpm_list)
             
         # Update neuromodulatory system
-        modulation_factors = self.neuromodulatory_system.update(
-            self.current_time, self.time_step, module_activities
+        self.neuromodulatory_system.update(
+            self.current_time, self.time_step, dict(zip(self._cpm_ids, activities.tolist()))
         )
         
         # Apply neuromodulation to CPMs
-        for cpm_id, factors in modulation_factors.items():
-            if cpm_id in self.cpms:
-                # Calculate overall modulation factor (simplified)
-                attention = factors[ModulationType.ATTENTION]
-                reward = factors[ModulationType.REWARD]
-                homeostatic = factors[ModulationType.HOMEOSTATIC]
-                plasticity = factors[ModulationType.PLASTICITY]
-                
-                # Apply modulation (simplified - in a full implementation this would be more complex)
-                overall_modulation = attention * reward * homeostatic
-                self.cpms[cpm_id].set_modulation(overall_modulation)
-        
-        # Collect outputs from executive module
-        outputs = {}
-        for cpm_id, output_spikes in cpm_outputs.items():
-            if "executive" in cpm_id:
-                # Convert spikes to output values
-                for output_index, spike_time in output_spikes:
-                    if output_index not in outputs:
-                        outputs[output_index] = 0
-                    outputs[output_index] += 1  # Count spikes
+        # Calculate overall modulation factors (simplified) for all CPMs at once,
+        # from the factor array whose rows follow self._cpm_ids
+        factors = self.neuromodulatory_system.modulation
+        overall_modulation = factors[:, _ATTENTION] * factors[:, _REWARD] * factors[:, _HOMEOSTATIC]
+        
+        # Apply modulation (simplified - in a full implementation this would be more complex)
+        for cpm, modulation in zip(self._cpm_list, overall_modulation.tolist()):
+            cpm.set_modulation(modulation)
+        
+        # Collect outputs from executive module, counting spikes per output index
+        output_indices = [output_index
+                          for cpm_id in self._executive_cpm_ids
+                          for output_index, _ in cpm_outputs.get(cpm_id, ())]
+        counts = np.bincount(np.array(output_indices, dtype=np.intp), minlength=self._output_size)
                     
-        # Normalize outputs
-        max_count = max(outputs.values()) if outputs else 1
-        normalized_outputs = {k: v / max_count for k, v in outputs.items()}
+        # Normalize outputs, keeping only the indices that spiked
+        max_count = counts.max(initial=0)
+        normalized = counts / max_count if max_count else np.zeros(len(counts))
+        nonzero_idx = np.flatnonzero(counts)
+        normalized_outputs = dict(zip(nonzero_idx.tolist(), normalized[nonzero_idx].tolist()))
         
         # Store in output buffer
         self.output_buffer = normalized_outputs
@@ -218,22 +264,38 @@ class NeuronOS:
         # Update system time
         self.current_time += self.time_step
         
-        # Record execution history
-        self.execution_history.append({
-            'time': self.current_time,
-            'inputs': input_data,
-            'outputs': normalized_outputs,
-            'activity': module_activities
-        })
+        # Record execution history (inputs are not kept, only activity and outputs)
+        self._record_history(activities, normalized)
         
         return normalized_outputs
         
+    def _deliver_spikes(self, target_id, spike_data):
+        """
+        Process delivered highway spikes one at a time in a target CPM.
+        
+        Args:
+            target_id: ID of the target CPM
+            spike_data: Payloads (input indices) of the spikes, in delivery order
+            
+        Returns:
+            List of (output_index, spike_time) tuples from all the spikes
+        """
+        cpm = self.cpms[target_id]
+        output = []
+        for data in spike_data:
+            # Convert to input format expected by CPM
+            cpm_input = [(int(data), self.current_time)]
+            output.extend(cpm.process_input(cpm_input, self.current_time, self.time_step))
+        return output
+        
     def run_simulation(self, input_sequence, duration=None):
         """
         Run a simulation with the provided input sequence.
         
         Args:
-            input_sequence: List of input data dictionaries for each time step
+            input_sequence: Iterable (list, generator, ...) of input data dictionaries,
+                one per time step; it is consumed one step at a time, and steps past
+                its end get no input
             duration: Optional duration to run (defaults to config value)
             
         Returns:
@@ -246,16 +308,19 @@ class NeuronOS:
         if duration is None:
             duration = self.config.get('simulation_duration', 1000.0)
             
-        # Reset execution history
-        self.execution_history = []
-        
         # Run simulation
         outputs = []
         time_steps = int(duration / self.time_step)
         
+        # Reset execution history, with a row for every time step
+        self._allocate_history(time_steps)
+        
+        # Inputs are streamed, so only the current step's input is held
+        inputs = iter(input_sequence)
+        
         for t in range(time_steps):
             # Get input for this time step (if available)
-            input_data = input_sequence[t] if t < len(input_sequence) else {}
+            input_data = next(inputs, {})
             
             # Process input
             output = self.process_input(input_data)
@@ -275,13 +340,53 @@ class NeuronOS:
         """Reset the system to initial state."""
         self.current_time = 0.0
         self._initialize_components()
-        self.execution_history = []
+        self._allocate_history(0)
+        
+    def _allocate_history(self, steps):
+        """Allocate an empty execution history with room for the given number of steps."""
+        self._history_length = 0
+        self._hist_time = np.zeros(steps)
+        self._hist_activity = np.zeros((steps, len(self._cpm_ids)), dtype=np.float32)
+        self._hist_out = np.zeros((steps, self._output_size), dtype=np.float32)
+        
+    def _record_history(self, activities, outputs):
+        """Write one time step into the execution history, growing it when full."""
+        step = self._history_length
+        if step == len(self._hist_time):
+            # Double the capacity (steps run outside run_simulation aren't preallocated)
+            capacity = max(2 * step, 16)
+            self._hist_time = np.resize(self._hist_time, capacity)
+            self._hist_activity = np.resize(self._hist_activity, (capacity, len(self._cpm_ids)))
+            self._hist_out = np.resize(self._hist_out, (capacity, self._output_size))
+            
+        self._hist_time[step] = self.current_time
+        self._hist_activity[step] = activities
+        self._hist_out[step] = outputs
+        self._history_length = step + 1
+        
+    @property
+    def execution_history(self):
+        """
+        Get the execution history of the simulation so far.
+        
+        Returns:
+            Dictionary of per-step 'time' array, 'activity' array (one column per
+            CPM, in 'cpm_ids' order) and 'outputs' array (one column per output)
+        """
+        length = self._history_length
+        return {
+            'cpm_ids': list(self._cpm_ids),
+            'time': self._hist_time[:length],
+            'activity': self._hist_activity[:length],
+            'outputs': self._hist_out[:length]
+        }
         
     def get_system_state(self):
         """Get the current state of the system."""
         return {
             'time': self.current_time,
-            'cpms': {cpm_id: {'activity': cpm.get_activity_level()} for cpm_id, cpm in self.cpms.items()},
+            'cpms': {cpm_id: {'activity': activity}
+                     for cpm_id, activity in zip(self._cpm_ids, compute_all_activities(self._cpm_list).tolist())},
             'highways': {hw_id: {'congestion': hw.get_congestion_level()} for hw_id, hw in self.highways.items()},
             'neuromodulation': {
                 'attention': self.neuromodulatory_system.attention_level,
@@ -1,8 +1,7 @@
 import numpy as np
 import time
-import matplotlib.pyplot as plt
 from enum import Enum
-from collections import defaultdict
+from jit import njit, NUMBA_AVAILABLE
 
 # Simplified versions of NeuronOS components for demonstration
 class NPUState(Enum):
@@ -11,123 +10,196 @@ class NPUState(Enum):
     FIRING = 2
     REFRACTORY = 3
 
+# Integer NPU state codes used by the module state arrays
+_RESTING = NPUState.RESTING.value
+_INTEGRATION = NPUState.INTEGRATION.value
+_REFRACTORY = NPUState.REFRACTORY.value
+
+# LIF constants, float32 like the NPU state arrays so that the compiled and
+# NumPy updates round identically
+_LEAK = np.float32(0.9)
+_RESET_POTENTIAL = np.float32(-75.0)
+
+# (x, y, width, height) of each module in the system diagram
+MODULE_POSITIONS = {
+    "sensory": (2, 3.5, 2, 1),
+    "processing": (5, 3.5, 2, 1),
+    "executive": (8, 3.5, 2, 1)
+}
+
+@njit(cache=True, fastmath=True, nogil=True)
+def _lif_step(V, threshold, state, inputs, fired):
+    """
+    Compiled leaky integrate-and-fire step over a module's NPU arrays.
+    
+    Updates V and state in place and fills fired. NPU i receives input
+    i % len(inputs), or none when inputs is empty.
+    """
+    n_inputs = inputs.size
+    for i in range(V.size):
+        v = V[i] * _LEAK
+        if n_inputs:
+            v += inputs[i % n_inputs]
+        spiked = v >= threshold[i]
+        fired[i] = spiked
+        if spiked:
+            v = _RESET_POTENTIAL
+        V[i] = v
+        state[i] = _REFRACTORY if spiked else (_INTEGRATION if v > -65.0 else _RESTING)
+
 class NeuralProcessingUnit:
-    def __init__(self, id, threshold=-55.0):
+    """View of one NPU; its dynamics live in the module's state arrays."""
+    def __init__(self, id, module, index):
         self.id = id
-        self.membrane_potential = -70.0
-        self.threshold = threshold
-        self.state = NPUState.RESTING
-        self.connections = {}
+        self.module = module
+        self.index = index  # Position in the module's state arrays
         self.spike_history = []
         
-    def add_connection(self, target_id, weight=0.5):
-        self.connections[target_id] = weight
-        
-    def update(self, inputs, current_time):
-        # Simple leaky integrate-and-fire model
-        self.membrane_potential *= 0.9  # Leak
-        
-        # Process inputs
-        for input_val in inputs:
-            self.membrane_potential += input_val
-            
-        # Check for spike
-        if self.membrane_potential >= self.threshold:
-            self.state = NPUState.FIRING
-            self.spike_history.append(current_time)
-            self.membrane_potential = -75.0  # Reset
-            self.state = NPUState.REFRACTORY
-            return [(target_id, self.connections[target_id]) for target_id in self.connections]
-        
-        if self.membrane_potential > -65.0:
-            self.state = NPUState.INTEGRATION
-        else:
-            self.state = NPUState.RESTING
-            
-        return []
+    @property
+    def membrane_potential(self):
+        return float(self.module.V[self.index])
+    
+    @property
+    def threshold(self):
+        return float(self.module.threshold[self.index])
+    
+    @property
+    def state(self):
+        return NPUState(int(self.module.state[self.index]))
+    
+    @property
+    def connections(self):
+        """Map of target NPU ID to weight, read from the module's CSR arrays."""
+        module = self.module
+        start, end = module.conn_indptr[self.index], module.conn_indptr[self.index + 1]
+        return {module._npu_list[target].id: float(weight)
+                for target, weight in zip(module.conn_targets[start:end], module.conn_weights[start:end])}
 
 class CorticalProcessingModule:
-    def __init__(self, id, size=10):
+    def __init__(self, id, size=10, rng=None):
         self.id = id
         self.npus = {}
-        self.activity_history = []
+        
+        # NPU state as structure-of-arrays, indexed like self.npus
+        self.V = np.full(size, -70.0, dtype=np.float32)  # Membrane potentials
+        self.threshold = np.full(size, -55.0, dtype=np.float32)
+        self.state = np.full(size, _RESTING, dtype=np.int8)
+        self._fired = np.zeros(size, dtype=np.bool_)
+        self._npu_index = np.arange(size)
         
         # Create NPUs
         for i in range(size):
             npu_id = f"{id}_{i}"
-            self.npus[npu_id] = NeuralProcessingUnit(npu_id)
+            self.npus[npu_id] = NeuralProcessingUnit(npu_id, self, i)
+        self._npu_list = list(self.npus.values())
             
-        # Connect NPUs (simple random connectivity)
-        for source_id, source_npu in self.npus.items():
-            for target_id, target_npu in self.npus.items():
-                if source_id != target_id and np.random.random() < 0.3:
-                    source_npu.add_connection(target_id, np.random.random() * 0.5)
+        # Connect NPUs (simple random connectivity), stored in CSR form: the
+        # connections of NPU i are conn_targets/conn_weights[conn_indptr[i]:conn_indptr[i + 1]]
+        rng = rng if rng is not None else np.random.default_rng()
+        connected = rng.random((size, size)) < 0.3
+        np.fill_diagonal(connected, False)
+        self.conn_indptr = np.zeros(size + 1, dtype=np.int32)
+        np.cumsum(connected.sum(axis=1), out=self.conn_indptr[1:])
+        self.conn_targets = np.nonzero(connected)[1].astype(np.int32)  # Row-major, so grouped by source
+        self.conn_weights = (rng.random(len(self.conn_targets)) * 0.5).astype(np.float32)
+        self._conn_source = np.repeat(np.arange(size), np.diff(self.conn_indptr))  # Source NPU of each connection
     
     def process(self, inputs, current_time):
-        # Distribute inputs to NPUs
-        outputs = []
-        active_npus = 0
+        # Distribute inputs to NPUs: NPU i receives input i % len(inputs)
+        inputs = np.asarray(inputs, dtype=np.float32).ravel()
         
-        # Process each NPU
-        for i, (npu_id, npu) in enumerate(self.npus.items()):
-            # Get input for this NPU - Fixed to handle numpy arrays properly
-            npu_input = []
-            if len(inputs) > 0:
-                input_idx = i % len(inputs)
-                # Convert numpy array element to scalar if needed
-                if isinstance(inputs[input_idx], np.ndarray) and inputs[input_idx].size == 1:
-                    npu_input = [float(inputs[input_idx])]
-                else:
-                    npu_input = [inputs[input_idx]]
-            
-            # Process and collect outputs
-            npu_outputs = npu.update(npu_input, current_time)
-            outputs.extend(npu_outputs)
-            
-            # Track activity
-            if npu.state != NPUState.RESTING:
-                active_npus += 1
+        # Simple leaky integrate-and-fire step over all NPUs at once, updating
+        # the state arrays in place
+        fired = self._fired
+        if NUMBA_AVAILABLE:
+            _lif_step(self.V, self.threshold, self.state, inputs, fired)
+        else:
+            V = self.V
+            V *= _LEAK
+            if inputs.size:
+                V += inputs.take(self._npu_index, mode='wrap')
                 
-        # Record activity level
+            # Spiking NPUs reset and enter the refractory state; the others
+            # integrate or rest depending on their potential
+            np.greater_equal(V, self.threshold, out=fired)
+            np.copyto(V, _RESET_POTENTIAL, where=fired)
+            np.copyto(self.state, np.where(V > -65.0, _INTEGRATION, _RESTING))
+            np.copyto(self.state, _REFRACTORY, where=fired)
+        
+        # Spiking NPUs send to all their connections: the output is the weight
+        # of every connection leaving a spiking NPU, in source order
+        for i in np.flatnonzero(fired):
+            self._npu_list[i].spike_history.append(current_time)
+        outputs = self.conn_weights[fired[self._conn_source]]
+                
+        # Activity level: fraction of NPUs away from rest
+        active_npus = int(np.count_nonzero(self.state != _RESTING))
         activity_level = active_npus / len(self.npus)
-        self.activity_history.append((current_time, activity_level))
         
         return outputs, activity_level
 
 class NeuronOSVisualDemo:
-    def __init__(self):
+    def __init__(self, seed=0):
+        # One random stream for the module wiring and generated inputs, so a
+        # seed reproduces the whole run (None for fresh entropy)
+        self.rng = np.random.default_rng(seed)
+        
         # Create modules
         self.modules = {
-            "sensory": CorticalProcessingModule("sensory", 20),
-            "processing": CorticalProcessingModule("processing", 30),
-            "executive": CorticalProcessingModule("executive", 15)
+            "sensory": CorticalProcessingModule("sensory", 20, self.rng),
+            "processing": CorticalProcessingModule("processing", 30, self.rng),
+            "executive": CorticalProcessingModule("executive", 15, self.rng)
         }
         
         # System state
         self.current_time = 0
-        self.activity_history = defaultdict(list)
-        self.spike_counts = defaultdict(list)
+        self._allocate_history(0)
         
-    def run_simulation(self, duration=100, input_pattern=None):
-        """Run a simulation with visualization"""
-        print("Starting NeuronOS Visual Demo simulation...")
+    def _allocate_history(self, duration):
+        """Allocate the per-module activity and spike count buffers for a run."""
+        self._act = np.zeros((len(self.modules), duration), dtype=np.float32)  # Activity level [module, t]
+        self._spikes = np.zeros((len(self.modules), duration), dtype=np.int32)  # Spike count [module, t]
+        self._steps = 0  # Number of time steps recorded
         
-        # Set up visualization
-        plt.figure(figsize=(12, 8))
-        plt.ion()  # Interactive mode
+    def run_simulation(self, duration=100, input_pattern=None, visualize=True, save_path=None):
+        """
+        Run a simulation, optionally with live visualization.
         
-        # Create subplots
-        ax1 = plt.subplot(2, 2, 1)  # Activity levels
-        ax2 = plt.subplot(2, 2, 2)  # Spike raster plot
-        ax3 = plt.subplot(2, 1, 2)  # System diagram
+        Args:
+            duration: Number of time steps to simulate
+            input_pattern: List of input patterns, cycled through (generated if None)
+            visualize: Whether to show and update the plots while simulating
+            save_path: Optional file to save the final plots to
+        """
+        print("Starting NeuronOS Visual Demo simulation...")
         
-        # System diagram (static)
-        self._draw_system_diagram(ax3)
+        # Set up visualization (not needed at all for a headless run)
+        plotting = visualize or save_path is not None
+        if plotting:
+            # matplotlib is only imported when plotting, so headless runs don't need it
+            import matplotlib.pyplot as plt
+            self._plt = plt
+            
+            fig = plt.figure(figsize=(12, 8))
+            if visualize:
+                plt.ion()  # Interactive mode
+            
+            # Create subplots
+            ax1 = plt.subplot(2, 2, 1)  # Activity levels
+            ax2 = plt.subplot(2, 2, 2)  # Spike raster plot
+            ax3 = plt.subplot(2, 1, 2)  # System diagram
+            
+            # Plot lines and system diagram, created once and updated in place
+            self._setup_visualization(ax1, ax2, ax3)
         
         # Generate input pattern if not provided
         if input_pattern is None:
             input_pattern = self._generate_input_pattern(duration)
         
+        # Activity and spike count buffers, one row per module
+        self._allocate_history(duration)
+        rows = {module_name: row for row, module_name in enumerate(self.modules)}
+        
         # Run simulation
         for t in range(duration):
             self.current_time = t
@@ -135,30 +207,28 @@ class NeuronOSVisualDemo:
             # Get input for this time step
             current_input = input_pattern[t % len(input_pattern)]
             
-            # Convert to list of floats to avoid numpy array issues
-            current_input_list = [float(x) for x in current_input]
+            # Process through modules; each module's output weights are passed
+            # on to the next one as is
+            sensory_output, sensory_activity = self.modules["sensory"].process(current_input, t)
+            self._act[rows["sensory"], t] = sensory_activity
+            self._spikes[rows["sensory"], t] = len(sensory_output)
             
-            # Process through modules
-            sensory_output, sensory_activity = self.modules["sensory"].process(current_input_list, t)
-            self.activity_history["sensory"].append((t, sensory_activity))
-            self.spike_counts["sensory"].append(len(sensory_output))
+            # Pass to processing module
+            processing_output, processing_activity = self.modules["processing"].process(sensory_output, t)
+            self._act[rows["processing"], t] = processing_activity
+            self._spikes[rows["processing"], t] = len(processing_output)
             
-            # Pass to processing module - ensure we're passing simple float values
-            processing_input = [float(weight) for _, weight in sensory_output]
-            processing_output, processing_activity = self.modules["processing"].process(processing_input, t)
-            self.activity_history["processing"].append((t, processing_activity))
-            self.spike_counts["processing"].append(len(processing_output))
-            
-            # Pass to executive module - ensure we're passing simple float values
-            executive_input = [float(weight) for _, weight in processing_output]
-            executive_output, executive_activity = self.modules["executive"].process(executive_input, t)
-            self.activity_history["executive"].append((t, executive_activity))
-            self.spike_counts["executive"].append(len(executive_output))
+            # Pass to executive module
+            executive_output, executive_activity = self.modules["executive"].process(processing_output, t)
+            self._act[rows["executive"], t] = executive_activity
+            self._spikes[rows["executive"], t] = len(executive_output)
+            self._steps = t + 1
             
             # Update visualization every 5 steps
-            if t % 5 == 0 or t == duration - 1:
+            if visualize and (t % 5 == 0 or t == duration - 1):
                 self._update_visualization(ax1, ax2, ax3, t)
-                plt.pause(0.1)
+                fig.canvas.draw_idle()
+                fig.canvas.flush_events()
                 
             # Print progress
             if t % 10 == 0:
@@ -166,25 +236,26 @@ class NeuronOSVisualDemo:
         
         print("Simulation completed!")
         print("Final activity levels:")
-        for module_name, history in self.activity_history.items():
-            if history:
-                print(f"  {module_name}: {history[-1][1]:.2f}")
+        if self._steps:
+            for module_name, activity in zip(self.modules, self._act[:, self._steps - 1]):
+                print(f"  {module_name}: {activity:.2f}")
+        
+        # Save the final plots, drawn once
+        if save_path is not None:
+            self._update_visualization(ax1, ax2, ax3, self._steps - 1)
+            fig.savefig(save_path)
+            if not visualize:
+                plt.close(fig)
         
         # Keep plot open
-        plt.ioff()
-        plt.show()
+        if visualize:
+            plt.ioff()
+            plt.show()
     
     def _generate_input_pattern(self, duration):
-        """Generate a simple input pattern"""
-        patterns = []
-        
-        # Create a few different patterns
-        for _ in range(min(5, duration)):
-            # Random binary pattern - convert to list of floats immediately
-            pattern = (np.random.rand(10) > 0.7).astype(float)
-            patterns.append(pattern)
-            
-        return patterns
+        """Generate a simple input pattern: a float32 array of a few patterns, one per row"""
+        # Create a few different random binary patterns
+        return (self.rng.random((min(5, duration), 10), dtype=np.float32) > 0.7).astype(np.float32)
     
     def _draw_system_diagram(self, ax):
         """Draw the system diagram"""
@@ -194,13 +265,6 @@ class NeuronOSVisualDemo:
         ax.set_title("NeuronOS System Activity")
         ax.axis('off')
         
-        # Draw modules
-        module_positions = {
-            "sensory": (2, 3.5, 2, 1),
-            "processing": (5, 3.5, 2, 1),
-            "executive": (8, 3.5, 2, 1)
-        }
-        
         module_colors = {
             "sensory": "#c6ecc6",
             "processing": "#c6d9ec",
@@ -208,9 +272,9 @@ class NeuronOSVisualDemo:
         }
         
         # Draw modules
-        for module_name, (x, y, width, height) in module_positions.items():
+        for module_name, (x, y, width, height) in MODULE_POSITIONS.items():
             color = module_colors[module_name]
-            rect = plt.Rectangle((x, y), width, height, facecolor=color, edgecolor='black', alpha=0.8)
+            rect = self._plt.Rectangle((x, y), width, height, facecolor=color, edgecolor='black', alpha=0.8)
             ax.add_patch(rect)
             ax.text(x + width/2, y + height/2, module_name.capitalize(), ha='center', va='center')
         
@@ -218,64 +282,62 @@ class NeuronOSVisualDemo:
         ax.arrow(4, 3.5 + 0.5, 0.9, 0, head_width=0.1, head_length=0.1, fc='black', ec='black')
         ax.arrow(7, 3.5 + 0.5, 0.9, 0, head_width=0.1, head_length=0.1, fc='black', ec='black')
     
-    def _update_visualization(self, ax1, ax2, ax3, current_time):
-        """Update the visualization"""
-        # Update activity plot
-        ax1.clear()
+    def _setup_visualization(self, ax1, ax2, ax3):
+        """Create the persistent plot artists that _update_visualization updates"""
+        # Activity plot
         ax1.set_title("Module Activity Levels")
         ax1.set_xlabel("Time")
         ax1.set_ylabel("Activity Level")
         ax1.set_ylim(0, 1)
-        
-        for module_name, history in self.activity_history.items():
-            if history:
-                times, activities = zip(*history)
-                ax1.plot(times, activities, label=module_name)
-        
+        self._activity_lines = {name: ax1.plot([], [], label=name)[0] for name in self.modules}
         ax1.legend()
         
-        # Update spike raster plot
-        ax2.clear()
+        # Spike count plot
         ax2.set_title("Spike Counts")
         ax2.set_xlabel("Time")
         ax2.set_ylabel("Spikes")
-        
-        for i, (module_name, counts) in enumerate(self.spike_counts.items()):
-            if counts:
-                ax2.plot(range(len(counts)), counts, label=module_name)
-        
+        self._spike_lines = {name: ax2.plot([], [], label=name)[0] for name in self.modules}
         ax2.legend()
         
-        # Update system diagram
+        # System diagram (static)
         self._draw_system_diagram(ax3)
         
-        # Add activity indicators to system diagram
-        module_positions = {
-            "sensory": (2, 3.5, 2, 1),
-            "processing": (5, 3.5, 2, 1),
-            "executive": (8, 3.5, 2, 1)
-        }
+        # Activity indicators and spike counts on the system diagram
+        self._activity_indicators = {}
+        self._spike_texts = {}
+        for module_name, (x, y, width, height) in MODULE_POSITIONS.items():
+            indicator = self._plt.Rectangle((x + width * 0.8, y + height * 0.1), 
+                                            width * 0.1, 0, 
+                                            facecolor='red', alpha=0.7)
+            ax3.add_patch(indicator)
+            self._activity_indicators[module_name] = indicator
+            self._spike_texts[module_name] = ax3.text(x + width/2, y - 0.2, "", 
+                                                      ha='center', va='center', fontsize=8)
+    
+    def _update_visualization(self, ax1, ax2, ax3, current_time):
+        """Update the visualization"""
+        steps = self._steps
+        if not steps:
+            return
+        times = np.arange(steps)
         
-        for module_name, history in self.activity_history.items():
-            if history:
-                # Get current activity
-                current_activity = history[-1][1] if history else 0
-                
-                # Get module position
-                x, y, width, height = module_positions[module_name]
-                
-                # Draw activity indicator
-                indicator_height = current_activity * height * 0.8
-                indicator = plt.Rectangle((x + width * 0.8, y + height * 0.1), 
-                                         width * 0.1, indicator_height, 
-                                         facecolor='red', alpha=0.7)
-                ax3.add_patch(indicator)
-                
-                # Add spike count
-                if module_name in self.spike_counts and self.spike_counts[module_name]:
-                    spike_count = self.spike_counts[module_name][-1]
-                    ax3.text(x + width/2, y - 0.2, f"Spikes: {spike_count}", 
-                            ha='center', va='center', fontsize=8)
+        # Update activity plot
+        for line, activities in zip(self._activity_lines.values(), self._act[:, :steps]):
+            line.set_data(times, activities)
+        ax1.relim()
+        ax1.autoscale_view(scaley=False)
+        
+        # Update spike count plot
+        for line, counts in zip(self._spike_lines.values(), self._spikes[:, :steps]):
+            line.set_data(times, counts)
+        ax2.relim()
+        ax2.autoscale_view()
+        
+        # Update activity indicators and spike counts on the system diagram
+        for row, module_name in enumerate(self.modules):
+            height = MODULE_POSITIONS[module_name][3]
+            self._activity_indicators[module_name].set_height(self._act[row, steps - 1] * height * 0.8)
+            self._spike_texts[module_name].set_text(f"Spikes: {self._spikes[row, steps - 1]}")
 
 # Run the demo if executed directly
 if __name__ == "__main__":
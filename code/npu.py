@@ -1,7 +1,13 @@
 # Neural Processing Unit (NPU) Implementation
 
+import math
 import numpy as np
 from enum import Enum
+from collections import deque
+
+from jit import njit, prange, NUMBA_AVAILABLE
+from gpu import cupy, cupy_sparse, check_device
+from sparse import scipy_sparse, SCIPY_AVAILABLE
 
 class NPUState(Enum):
     RESTING = 0
@@ -9,11 +15,212 @@ class NPUState(Enum):
     FIRING = 2
     REFRACTORY = 3
 
+# Number of recent spike times kept in NeuralProcessingUnit.spike_history
+SPIKE_HISTORY_LENGTH = 10
+
+# Spike time differences are truncated to this resolution (ms) to look up STDP
+# weight changes in precomputed tables, indexed by int(|delta_t| * _STDP_STEPS_PER_MS)
+STDP_RESOLUTION = 0.1
+_STDP_STEPS_PER_MS = 1.0 / STDP_RESOLUTION
+
+# Quantized population weights are int8 steps of 1 / QUANTIZED_WEIGHT_STEPS,
+# covering the STDP weight range [0, 1]
+QUANTIZED_WEIGHT_STEPS = 127
+
+# Returned by NeuralProcessingUnit.update when the NPU does not fire; target
+# arrays hold the synapse keys as they are (any hashable NPU ID), so use dtype object
+_NO_TARGETS = np.empty(0, dtype=object)
+_NO_TARGETS.flags.writeable = False
+
+# Integer NPU state codes used by the update code and the population state arrays
+_RESTING = NPUState.RESTING.value
+_INTEGRATION = NPUState.INTEGRATION.value
+_FIRING = NPUState.FIRING.value
+_REFRACTORY = NPUState.REFRACTORY.value
+
+# Fraction of spiking NPUs below which spikes are delivered by walking only the
+# synapse or weight rows of the spiking NPUs, instead of all synapses or a dense
+# matrix-vector product; shared with cpm
+SPARSE_DELIVERY_FRACTION = 0.1
+
+# Fraction of awake NPUs below which the NumPy population update gathers and
+# updates only those; idle NPUs (resting at exactly the resting potential,
+# with no input) would be left unchanged by the update anyway
+SPARSE_UPDATE_FRACTION = 0.25
+
+# Populations (and cpm layers in process_batch) with at least this many NPUs
+# update them on multiple threads; below it, thread startup costs more than it saves
+PARALLEL_MIN_SIZE = 4096
+
+@njit(fastmath=True)
+def _npu_step(v, timer, state, current, resting_potential, threshold, reset_potential, beta,
+              refractory_period, time_step):
+    """
+    Compiled update of one NPU of a population, shared by the population kernels.
+    
+    Takes and returns the NPU's (potential, refractory timer, state) as scalars,
+    plus whether it fired.
+    """
+    # Handle refractory period; an NPU whose period runs out integrates again
+    if state == _REFRACTORY:
+        timer = max(timer - time_step, 0.0)
+    active = timer <= 0
+    
+    # Leaky integration (exact exponential decay by beta) and threshold crossing
+    if active:
+        v = resting_potential + (v - resting_potential) * beta + current
+    spiked = active and v >= threshold
+    if spiked:
+        v = reset_potential
+        timer = refractory_period
+    
+    # Spiking and still refractory NPUs are refractory; the others integrate
+    # if they received input, and rest otherwise
+    if spiked or not active:
+        state = _REFRACTORY
+    elif current > 0:
+        state = _INTEGRATION
+    else:
+        state = _RESTING
+    return v, timer, state, spiked
+
+def _population_step(V, refractory, state, current, fired, resting_potential, threshold,
+                     reset_potential, beta, refractory_period, time_step):
+    """
+    Compiled update of every NPU of a population; same semantics as the
+    NumPy path of NeuralPopulation.update. Fills fired.
+    """
+    for i in prange(V.size):
+        V[i], refractory[i], state[i], fired[i] = _npu_step(
+            V[i], refractory[i], state[i], current[i], resting_potential, threshold,
+            reset_potential, beta, refractory_period, time_step)
+
+_serial_population_step = njit(cache=True, fastmath=True, nogil=True)(_population_step)
+_parallel_population_step = njit(cache=True, fastmath=True, nogil=True, parallel=True)(_population_step)
+
+# Population kernels specialized on (size, parameters, time step)
+_POPULATION_KERNELS = {}
+
+def _make_population_step(size, resting_potential, threshold, reset_potential, beta,
+                          refractory_period, time_step):
+    """
+    Get a population update compiled for one fixed size, set of parameters and time step.
+    
+    The returned step(V, refractory, state, current, fired) has the same
+    semantics as _population_step. Its arguments beyond the arrays are closure
+    constants, so Numba compiles them into the kernel as immediates and the
+    loop bound is known. Kernels are cached since populations with the same
+    key can share one.
+    """
+    key = (size, resting_potential, threshold, reset_potential, beta, refractory_period, time_step)
+    step = _POPULATION_KERNELS.get(key)
+    if step is None:
+        @njit(fastmath=True, nogil=True, parallel=size >= PARALLEL_MIN_SIZE)
+        def step(V, refractory, state, current, fired):
+            for i in prange(size):
+                V[i], refractory[i], state[i], fired[i] = _npu_step(
+                    V[i], refractory[i], state[i], current[i], resting_potential, threshold,
+                    reset_potential, beta, refractory_period, time_step)
+        _POPULATION_KERNELS[key] = step
+    return step
+
+_CUDA_POPULATION_STEP = None
+
+def _cuda_population_step():
+    """
+    Get the CUDA update of every NPU of a population, compiled on first use;
+    same semantics as _population_step, fused into one elementwise kernel.
+    """
+    global _CUDA_POPULATION_STEP
+    if _CUDA_POPULATION_STEP is None:
+        _CUDA_POPULATION_STEP = cupy.ElementwiseKernel(
+            'float32 current, float32 resting_potential, float32 threshold, float32 reset_potential, '
+            'float32 beta, float32 refractory_period, float32 time_step',
+            'float32 V, float32 refractory, uint8 state, bool fired',
+            f'''
+            float timer = refractory;
+            if (state == {_REFRACTORY}) timer = max(timer - time_step, 0.0f);
+            bool active = timer <= 0;
+            float v = V;
+            if (active) v = resting_potential + (v - resting_potential) * beta + current;
+            bool spiked = active && v >= threshold;
+            fired = spiked;
+            if (spiked) {{
+                v = reset_potential;
+                timer = refractory_period;
+            }}
+            V = v;
+            refractory = timer;
+            if (spiked || !active) state = {_REFRACTORY};
+            else if (current > 0) state = {_INTEGRATION};
+            else state = {_RESTING};
+            ''',
+            'neuronos_population_step')
+    return _CUDA_POPULATION_STEP
+
+@njit(cache=True, nogil=True)
+def _population_stdp(spiked, current_time, last_spike_time, indptr, indices, weights, max_weight,
+                     synapse_source, target_indptr, by_target, stdp_plus, stdp_minus):
+    """
+    Compiled STDP update for the NPUs of a population that just fired; same
+    semantics as the NumPy path of NeuralPopulation._apply_stdp.
+    """
+    # Potentiate the synapses into spiking NPUs from NPUs that fired before them
+    for i in spiked:
+        for j in range(target_indptr[i], target_indptr[i + 1]):
+            e = by_target[j]
+            k = (current_time - last_spike_time[synapse_source[e]]) * _STDP_STEPS_PER_MS
+            if k < stdp_plus.size:
+                weights[e] = max(0.0, min(max_weight, weights[e] + stdp_plus[int(k)]))
+    
+    # Then depress the synapses out of them to NPUs that fired before them
+    for i in spiked:
+        for e in range(indptr[i], indptr[i + 1]):
+            k = (current_time - last_spike_time[indices[e]]) * _STDP_STEPS_PER_MS
+            if k < stdp_minus.size:
+                weights[e] = max(0.0, min(max_weight, weights[e] - stdp_minus[int(k)]))
+
+def _csr_entries(indptr, rows):
+    """Get the positions of all entries of the given CSR rows, row by row."""
+    starts = indptr[rows]
+    lengths = indptr[rows + 1] - starts
+    # Offset of each entry from the start of its row, plus the row start
+    row_offsets = np.repeat(starts - np.cumsum(lengths) + lengths, lengths)
+    return row_offsets + np.arange(lengths.sum())
+
+_STDP_TABLES = {}  # Maps (amplitude, tau, window) to its STDP lookup table
+
+def _stdp_table(amplitude, tau, window):
+    """
+    Get the STDP weight change amplitude * exp(-|delta_t| / tau) for every
+    |delta_t| below window, in steps of STDP_RESOLUTION.
+    
+    The table has int(window / STDP_RESOLUTION) entries, so an index
+    int(|delta_t| / STDP_RESOLUTION) is in the table exactly when
+    |delta_t| < window (for windows that are multiples of the resolution).
+    
+    Tables only depend on the STDP parameters, so NPUs with the same
+    parameters share one.
+    """
+    key = (amplitude, tau, window)
+    table = _STDP_TABLES.get(key)
+    if table is None:
+        steps = np.arange(int(window * _STDP_STEPS_PER_MS))
+        table = tuple((amplitude * np.exp(-steps * STDP_RESOLUTION / tau)).tolist())
+        _STDP_TABLES[key] = table
+    return table
+
 class NeuralProcessingUnit:
     """
     Implementation of a Neural Processing Unit (NPU) that mimics both neural and synaptic behaviors
     based on the single-transistor artificial neuron technology.
     """
+    # Fixed attribute slots: no per-NPU __dict__, and faster attribute access
+    __slots__ = ('id', 'resting_potential', 'threshold', 'reset_potential', 'membrane_time_constant',
+                 'refractory_period', 'membrane_potential', '_state', 'refractory_time_remaining',
+                 '_beta', '_beta_time_step', 'synapses', '_targets', 'input_buffer',
+                 'stdp_window', 'stdp_a_plus', 'stdp_a_minus', 'stdp_tau_plus', 'stdp_tau_minus',
+                 'last_spike_time', 'spike_history')
     
     def __init__(self, id, resting_potential=-70.0, threshold=-55.0, reset_potential=-75.0, 
                  membrane_time_constant=10.0, refractory_period=2.0):
@@ -37,11 +244,13 @@ class NeuralProcessingUnit:
         
         # Current state
         self.membrane_potential = resting_potential
-        self.state = NPUState.RESTING
+        self._state = _RESTING  # NPUState value, exposed as the state property
         self.refractory_time_remaining = 0.0
+        self._beta_time_step = None  # Time step the cached decay factor is for
         
         # Synaptic connections
         self.synapses = {}  # Maps target NPU IDs to synaptic weights
+        self._targets = None  # Array of the synapse keys, rebuilt after add_synapse
         self.input_buffer = []  # Incoming spikes with timestamps
         
         # Learning parameters
@@ -53,11 +262,21 @@ class NeuralProcessingUnit:
         
         # Activity tracking
         self.last_spike_time = 0.0
-        self.spike_history = []
+        self.spike_history = deque(maxlen=SPIKE_HISTORY_LENGTH)  # Oldest dropped first
+        
+    @property
+    def state(self):
+        """Current NPUState of the NPU."""
+        return NPUState(self._state)
+    
+    @state.setter
+    def state(self, value):
+        self._state = value.value
         
     def add_synapse(self, target_id, weight=0.5):
         """Add or update a synaptic connection to another NPU."""
         self.synapses[target_id] = weight
+        self._targets = None
         
     def receive_spike(self, source_id, timestamp):
         """Receive a spike from another NPU."""
@@ -72,87 +291,508 @@ class NeuralProcessingUnit:
             time_step: Duration of time step (ms)
             
         Returns:
-            List of (target_id, spike_time) tuples if the NPU fires, empty list otherwise
+            Read-only object array of the target NPU IDs (the keys of synapses),
+            which all receive a spike at current_time, if the NPU fires; an
+            empty array of the same dtype otherwise
         """
-        output_spikes = []
-        
         # Handle refractory period
-        if self.state == NPUState.REFRACTORY:
+        if self._state == _REFRACTORY:
             self.refractory_time_remaining -= time_step
             if self.refractory_time_remaining <= 0:
-                self.state = NPUState.RESTING
+                self._state = _RESTING
                 self.refractory_time_remaining = 0
                 
-        # Process incoming spikes
+        # Process incoming spikes in one pass, keeping the ones not yet due
         input_current = 0.0
-        for source_id, spike_time in self.input_buffer:
-            if current_time - spike_time <= time_step:  # Only process recent spikes
-                # Apply synaptic weight (assuming source_id is directly connected)
-                input_current += 1.0  # Normalized input
-                
-                # Apply STDP if this NPU has fired recently
-                if self.spike_history and source_id in self.synapses:
-                    for spike_time in self.spike_history:
-                        delta_t = spike_time - current_time
-                        if abs(delta_t) < self.stdp_window:
-                            self._apply_stdp(source_id, delta_t)
+        pending = []
+        for spike in self.input_buffer:
+            source_id, spike_time = spike
+            if current_time - spike_time > time_step:
+                pending.append(spike)
+                continue
+            
+            # Only process recent spikes
+            # Apply synaptic weight (assuming source_id is directly connected)
+            input_current += 1.0  # Normalized input
+            
+            # Apply STDP if this NPU has fired recently
+            if self.spike_history and source_id in self.synapses:
+                self._apply_stdp(source_id, current_time)
         
         # Clear processed spikes
-        self.input_buffer = [(s, t) for s, t in self.input_buffer 
-                             if current_time - t > time_step]
+        self.input_buffer = pending
         
         # Update membrane potential based on current state
-        if self.state != NPUState.REFRACTORY:
-            # Leaky integration
-            self.membrane_potential += (
-                (self.resting_potential - self.membrane_potential) / self.membrane_time_constant * time_step
+        if self._state != _REFRACTORY:
+            # Leaky integration: exact exponential decay towards the resting potential
+            if time_step != self._beta_time_step:
+                self._beta = math.exp(-time_step / self.membrane_time_constant)
+                self._beta_time_step = time_step
+            self.membrane_potential = (
+                self.resting_potential + (self.membrane_potential - self.resting_potential) * self._beta
                 + input_current
             )
             
             # Check for threshold crossing
             if self.membrane_potential >= self.threshold:
                 # Generate spike
-                self.state = NPUState.FIRING
+                self._state = _FIRING
                 self.last_spike_time = current_time
                 self.spike_history.append(current_time)
-                if len(self.spike_history) > 10:  # Keep history limited
-                    self.spike_history.pop(0)
                 
                 # Reset membrane potential and enter refractory period
                 self.membrane_potential = self.reset_potential
                 self.refractory_time_remaining = self.refractory_period
-                self.state = NPUState.REFRACTORY
+                self._state = _REFRACTORY
                 
                 # Generate output spikes to all connected NPUs
-                for target_id in self.synapses:
-                    output_spikes.append((target_id, current_time))
+                if self._targets is None:
+                    self._targets = np.fromiter(self.synapses, dtype=object, count=len(self.synapses))
+                    self._targets.flags.writeable = False  # Shared by every spike
+                return self._targets
             elif input_current > 0:
-                self.state = NPUState.INTEGRATION
+                self._state = _INTEGRATION
             else:
-                self.state = NPUState.RESTING
+                self._state = _RESTING
                 
-        return output_spikes
+        return _NO_TARGETS
     
-    def _apply_stdp(self, source_id, delta_t):
+    def _apply_stdp(self, source_id, current_time):
         """
         Apply Spike-Timing-Dependent Plasticity to update synaptic weight.
         
+        Each recent spike of this NPU changes the weight by the table value
+        for its time difference to the incoming spike, truncated to
+        STDP_RESOLUTION; differences of stdp_window or more fall beyond the
+        tables and leave it unchanged.
+        
         Args:
             source_id: ID of the source NPU
-            delta_t: Time difference between post and pre-synaptic spikes (ms)
+            current_time: Time of the incoming spike (ms)
         """
-        if source_id not in self.synapses:
+        weight = self.synapses[source_id]
+        # Tables for the current STDP parameters (cached, so this is a dict lookup)
+        stdp_plus = _stdp_table(self.stdp_a_plus, self.stdp_tau_plus, self.stdp_window)
+        stdp_minus = _stdp_table(self.stdp_a_minus, self.stdp_tau_minus, self.stdp_window)
+        
+        for fired_time in self.spike_history:
+            # Time difference between post and pre-synaptic spikes, as a table index
+            delta_t = fired_time - current_time
+            k = int((delta_t if delta_t > 0 else -delta_t) * _STDP_STEPS_PER_MS)
+            if delta_t > 0:  # Post-synaptic spike after pre-synaptic spike (potentiation)
+                if k < len(stdp_plus):
+                    weight = max(0.0, min(1.0, weight + stdp_plus[k]))
+            elif k < len(stdp_minus):  # Pre-synaptic spike after post-synaptic spike (depression)
+                weight = max(0.0, min(1.0, weight - stdp_minus[k]))
+        
+        self.synapses[source_id] = weight
+
+class NeuralPopulation:
+    """
+    A population of NPUs sharing the same parameters, with their state held as
+    parallel arrays (structure of arrays) instead of one object per NPU.
+    
+    Each update advances every NPU at once with the same dynamics as
+    NeuralProcessingUnit.update. Spikes between NPUs of the population are
+    delivered through a ring buffer of input currents, one slot per time step
+    of delay, and the synapses between them learn by STDP.
+    
+    With device='cuda' the state arrays (V, refractory, state, ring) are CuPy
+    arrays and each update runs on the GPU; spike indices are still returned
+    on the host, where STDP runs.
+    """
+    
+    def __init__(self, size, resting_potential=-70.0, threshold=-55.0, reset_potential=-75.0,
+                 membrane_time_constant=10.0, refractory_period=2.0, max_delay=1, quantize=False,
+                 device='cpu'):
+        """
+        Initialize a population of NPUs at rest.
+        
+        Args:
+            size: Number of NPUs in the population
+            resting_potential: Baseline membrane potential (mV)
+            threshold: Firing threshold potential (mV)
+            reset_potential: Potential after firing (mV)
+            membrane_time_constant: Time constant for potential decay (ms)
+            refractory_period: Duration of refractory period after firing (ms)
+            max_delay: Longest spike delivery delay (time steps)
+            quantize: Store synaptic weights as int8, in steps of 1 / QUANTIZED_WEIGHT_STEPS
+                (weights are then limited to the range [0, 1])
+            device: 'cpu', or 'cuda' to hold the state on the GPU and update it
+                there (requires CuPy)
+        """
+        check_device(device)
+        self.size = size
+        self.resting_potential = resting_potential
+        self.threshold = threshold
+        self.reset_potential = reset_potential
+        self.membrane_time_constant = membrane_time_constant
+        self.refractory_period = refractory_period
+        self.device = device
+        xp = cupy if device == 'cuda' else np  # Array module holding the state
+        
+        # Current state, one entry per NPU
+        self.V = xp.full(size, resting_potential, dtype=np.float32)  # Membrane potentials
+        self.refractory = xp.zeros(size, dtype=np.float32)  # Refractory time remaining
+        self.state = xp.full(size, _RESTING, dtype=np.uint8)  # NPUState values
+        self.last_spike_time = np.full(size, -np.inf)  # -inf until an NPU first fires
+        self._fired = np.zeros(size, dtype=np.bool_)
+        self._awake = np.zeros(size, dtype=np.bool_)  # NPUs that are not idle, for the NumPy update
+        self._beta_time_step = None  # Time step the cached decay factor is for
+        self._compiled_step = None  # (key, kernel) of the kernel made by compile()
+        
+        # Synapses in CSR form: the synapses of source NPU i are
+        # indices/weights[indptr[i]:indptr[i + 1]], indices holding target NPUs;
+        # quantized weights are held as int8 multiples of weight_scale
+        self.quantize = quantize
+        self.weight_scale = 1.0 / QUANTIZED_WEIGHT_STEPS if quantize else 1.0
+        self.set_connectivity(np.zeros(size + 1, dtype=np.int32), [], [])
+        
+        # Synapses added one at a time wait in COO form (parallel source, target
+        # and weight lists) until finalize_synapses merges them into the CSR arrays
+        self._new_sources = []
+        self._new_targets = []
+        self._new_weights = []
+        
+        # Learning parameters, as for NeuralProcessingUnit
+        self.stdp_enabled = True
+        self.stdp_window = 20.0  # Time window for STDP (ms)
+        self.stdp_a_plus = 0.1   # STDP potentiation strength
+        self.stdp_a_minus = 0.12  # STDP depression strength
+        self.stdp_tau_plus = 10.0  # STDP potentiation time constant
+        self.stdp_tau_minus = 10.0  # STDP depression time constant
+        self._stdp_params = None  # Parameters the cached STDP tables are for
+        
+        # Delayed input: ring[step % max_delay] sums the current arriving at update
+        # number step, and is read and cleared by that update
+        self.ring = xp.zeros((max_delay, size), dtype=np.float32)
+        self._step = 0  # Number of updates so far
+        
+    def _to_weight_units(self, values):
+        """Convert weight values to the storage type of self.weights."""
+        values = np.asarray(values, dtype=np.float32)
+        if self.quantize:
+            return np.round(np.clip(values, 0.0, 1.0) * QUANTIZED_WEIGHT_STEPS).astype(np.int8)
+        return values.copy()
+        
+    def set_connectivity(self, indptr, indices, weights):
+        """
+        Set the synapses between NPUs of the population, replacing any existing ones.
+        
+        Args:
+            indptr: CSR row pointer, with size + 1 entries
+            indices: Target NPU of each synapse, grouped by source NPU
+            weights: Synaptic weight of each synapse
+        """
+        self.indptr = np.asarray(indptr, dtype=np.int32)
+        self.indices = np.asarray(indices, dtype=np.int32)
+        self.weights = self._to_weight_units(weights)  # Copied, since STDP updates it in place
+        self._synapse_source = np.repeat(np.arange(self.size, dtype=np.int32),
+                                         np.diff(self.indptr))  # Source NPU of each synapse
+        
+        # The same synapses grouped by target NPU (CSC order), for finding the
+        # synapses into an NPU: by_target[target_indptr[i]:target_indptr[i + 1]]
+        self._by_target = np.argsort(self.indices, kind='stable').astype(np.int32)
+        self._target_indptr = np.zeros(self.size + 1, dtype=np.int32)
+        np.cumsum(np.bincount(self.indices, minlength=self.size), out=self._target_indptr[1:])
+        
+        # SciPy view of the synapses for dense spike delivery; it shares the
+        # weights array, so STDP updates reach it without a copy
+        self._matrix = None
+        if SCIPY_AVAILABLE:
+            self._matrix = scipy_sparse.csr_matrix((self.weights, self.indices, self.indptr),
+                                                   shape=(self.size, self.size))
+        
+        # GPU copy of the synapses, in the same CSR order
+        self._device_matrix = None
+        if self.device == 'cuda':
+            self._device_matrix = cupy_sparse.csr_matrix(
+                (cupy.asarray(self._float_weights()),
+                 cupy.asarray(self.indices), cupy.asarray(self.indptr)),
+                shape=(self.size, self.size))
+        
+    def add_synapse(self, source, target, weight=0.5):
+        """
+        Add a synapse between two NPUs of the population.
+        
+        The synapse is buffered, and takes effect when finalize_synapses runs,
+        which propagate and update do automatically.
+        
+        Args:
+            source: Index of the source NPU
+            target: Index of the target NPU
+            weight: Synaptic weight
+        """
+        self._new_sources.append(source)
+        self._new_targets.append(target)
+        self._new_weights.append(weight)
+        
+    def finalize_synapses(self):
+        """Merge the synapses buffered by add_synapse into the CSR arrays."""
+        if not self._new_sources:
             return
+        sources = np.concatenate([self._synapse_source, np.asarray(self._new_sources, dtype=np.int32)])
+        targets = np.concatenate([self.indices, np.asarray(self._new_targets, dtype=np.int32)])
+        weights = np.concatenate([self._float_weights(), np.asarray(self._new_weights, dtype=np.float32)])
+        self._new_sources, self._new_targets, self._new_weights = [], [], []
+        
+        # Group by source NPU, keeping existing synapses ahead of new ones
+        order = np.argsort(sources, kind='stable')
+        indptr = np.zeros(self.size + 1, dtype=np.int32)
+        np.cumsum(np.bincount(sources, minlength=self.size), out=indptr[1:])
+        self.set_connectivity(indptr, targets[order], weights[order])
+        
+    def propagate(self, spike_indices):
+        """
+        Get the synaptic current that spikes from some NPUs deliver to the population.
+        
+        Args:
+            spike_indices: Indices of the NPUs that fired
             
-        weight = self.synapses[source_id]
+        Returns:
+            Float32 array with the summed input current of each NPU (a CuPy
+            array with device='cuda')
+        """
+        self.finalize_synapses()
+        if self._device_matrix is not None:
+            # Sparse matrix-vector product over the synapses on the GPU
+            spiked = cupy.zeros(self.size, dtype=cupy.float32)
+            spiked[cupy.asarray(spike_indices, dtype=cupy.intp)] = 1.0
+            return self._device_matrix.T @ spiked
+        
+        spike_indices = np.asarray(spike_indices, dtype=np.intp)
+        if len(spike_indices) <= SPARSE_DELIVERY_FRACTION * self.size:
+            # Few spikes: walk only the synapses of the NPUs that fired
+            entries = _csr_entries(self.indptr, spike_indices)
+            current = np.bincount(self.indices[entries], weights=self.weights[entries], minlength=self.size)
+            current *= self.weight_scale
+        else:
+            # Many spikes: weight every synapse by whether its source fired
+            spiked = np.zeros(self.size, dtype=np.float32)
+            spiked[spike_indices] = 1.0
+            if self._matrix is not None:
+                # Sparse matrix-vector product over the transposed (target-major) view
+                return (self._matrix.T @ spiked * np.float32(self.weight_scale)).astype(np.float32)
+            current = np.bincount(self.indices, weights=self.weights * spiked[self._synapse_source],
+                                  minlength=self.size)
+            current *= self.weight_scale
+        return current.astype(np.float32)
+        
+    def deliver(self, spike_indices, delay=1):
+        """
+        Schedule the spikes of some NPUs for delivery through the population's synapses.
+        
+        Called after the update in which the NPUs fired; with a delay of 1 the
+        spikes arrive in the next update.
+        
+        Args:
+            spike_indices: Indices of the NPUs that fired
+            delay: Number of time steps until the spikes arrive (1 to max_delay)
+        """
+        if not 1 <= delay <= len(self.ring):
+            raise ValueError(f"Delay must be between 1 and {len(self.ring)} steps")
+        if len(spike_indices):
+            self.ring[(self._step + delay - 1) % len(self.ring)] += self.propagate(spike_indices)
+        
+    def update(self, current_time, time_step, input_current=None):
+        """
+        Update the state of every NPU for the current time step.
         
-        if delta_t > 0:  # Post-synaptic spike after pre-synaptic spike (potentiation)
-            dw = self.stdp_a_plus * np.exp(-delta_t / self.stdp_tau_plus)
-            weight += dw
-        else:  # Pre-synaptic spike after post-synaptic spike (depression)
-            dw = self.stdp_a_minus * np.exp(delta_t / self.stdp_tau_minus)
-            weight -= dw
+        Args:
+            current_time: Current simulation time (ms)
+            time_step: Duration of time step (ms)
+            input_current: Optional array with an external input current for each NPU,
+                added to the current delivered by spikes arriving this step
             
-        # Ensure weight stays in valid range
-        weight = max(0.0, min(1.0, weight))
-        self.synapses[source_id] = weight
+        Returns:
+            Integer array with the indices of the NPUs that fired
+        """
+        self.finalize_synapses()
+        
+        # Input arriving this step: spikes from the ring buffer plus any external current
+        current = self.ring[self._step % len(self.ring)]
+        if input_current is not None:
+            current += cupy.asarray(input_current) if self.device == 'cuda' else input_current
+        
+        # Compiled LIF step when available: the specialized kernel if compile() made
+        # one for these parameters, else the generic one, on multiple threads for
+        # large populations
+        if self.device == 'cuda':
+            fired = cupy.empty(self.size, dtype=cupy.bool_)
+            _cuda_population_step()(current, np.float32(self.resting_potential), np.float32(self.threshold),
+                                    np.float32(self.reset_potential), self._decay(time_step),
+                                    np.float32(self.refractory_period), np.float32(time_step),
+                                    self.V, self.refractory, self.state, fired)
+            spiked = cupy.asnumpy(fired)
+        elif NUMBA_AVAILABLE:
+            key = self._kernel_key(time_step)
+            if self._compiled_step is not None and self._compiled_step[0] == key:
+                self._compiled_step[1](self.V, self.refractory, self.state, current, self._fired)
+            else:
+                step = _parallel_population_step if self.size >= PARALLEL_MIN_SIZE else _serial_population_step
+                step(self.V, self.refractory, self.state, current, self._fired, *key[1:])
+            spiked = self._fired
+        else:
+            spiked = self._update_arrays(current, time_step)
+        spike_indices = np.flatnonzero(spiked)
+        
+        # Learn from the new spikes, timed against each partner NPU's previous spike
+        if self.stdp_enabled and len(spike_indices) and len(self.weights):
+            self._apply_stdp(spike_indices, current_time)
+            if self._device_matrix is not None:
+                self._device_matrix.data.set(self._float_weights())
+        self.last_spike_time[spike_indices] = current_time
+        
+        # The slot is free for spikes arriving max_delay steps from now
+        current.fill(0.0)
+        self._step += 1
+        
+        return spike_indices
+    
+    def compile(self, time_step):
+        """
+        Compile an update kernel specialized on this population's size, parameters
+        and time step, for long runs that keep them fixed.
+        
+        Later updates with the same time step and parameters use it; if either
+        changes, updates fall back to the generic kernel. Does nothing without
+        Numba or with device='cuda'.
+        
+        Args:
+            time_step: Duration of time step (ms) the kernel is for
+        """
+        if not NUMBA_AVAILABLE or self.device == 'cuda':
+            return
+        key = self._kernel_key(time_step)
+        step = _make_population_step(*key)
+        # Compile now, on scratch copies, so the first update isn't stalled
+        step(self.V.copy(), self.refractory.copy(), self.state.copy(),
+             np.zeros(self.size, dtype=np.float32), np.zeros(self.size, dtype=np.bool_))
+        self._compiled_step = (key, step)
+    
+    def _kernel_key(self, time_step):
+        """Get the size and float32 LIF constants the update kernels take for a time step."""
+        return (self.size, np.float32(self.resting_potential), np.float32(self.threshold),
+                np.float32(self.reset_potential), self._decay(time_step),
+                np.float32(self.refractory_period), np.float32(time_step))
+    
+    def _apply_stdp(self, spike_indices, current_time):
+        """
+        Apply Spike-Timing-Dependent Plasticity to the synapses of NPUs that fired.
+        
+        Synapses into a spiking NPU are potentiated, and synapses out of it are
+        depressed, by the table value for the time since the other NPU's last spike.
+        
+        Args:
+            spike_indices: Indices of the NPUs that fired
+            current_time: Current simulation time (ms)
+        """
+        stdp_plus, stdp_minus = self._stdp_tables()
+        if NUMBA_AVAILABLE:
+            _population_stdp(spike_indices, current_time, self.last_spike_time, self.indptr, self.indices,
+                             self.weights, self._max_weight(), self._synapse_source,
+                             self._target_indptr, self._by_target, stdp_plus, stdp_minus)
+            return
+        
+        weights = self.weights
+        for synapses, partners, table, sign in (
+                # Synapses into the spiking NPUs, from their sources (potentiation)
+                (self._by_target[_csr_entries(self._target_indptr, spike_indices)], self._synapse_source,
+                 stdp_plus, 1),
+                # Synapses out of the spiking NPUs, to their targets (depression)
+                (_csr_entries(self.indptr, spike_indices), self.indices, stdp_minus, -1)):
+            # Table index for the time since each partner's last spike, within the window
+            k = (current_time - self.last_spike_time[partners[synapses]]) * _STDP_STEPS_PER_MS
+            in_window = k < len(table)
+            synapses = synapses[in_window]
+            dw = table[k[in_window].astype(np.intp)]
+            weights[synapses] = np.clip(weights[synapses] + sign * dw.astype(np.float32), 0.0, self._max_weight())
+    
+    def _stdp_tables(self):
+        """
+        Get the (potentiation, depression) STDP tables for the current STDP
+        parameters, in the units of self.weights (int8 steps when quantized).
+        
+        The tables are rebuilt only when a parameter has changed.
+        """
+        params = (self.stdp_a_plus, self.stdp_tau_plus, self.stdp_a_minus, self.stdp_tau_minus, self.stdp_window)
+        if params != self._stdp_params:
+            self._stdp_plus = self._to_weight_units(
+                _stdp_table(self.stdp_a_plus, self.stdp_tau_plus, self.stdp_window))
+            self._stdp_minus = self._to_weight_units(
+                _stdp_table(self.stdp_a_minus, self.stdp_tau_minus, self.stdp_window))
+            self._stdp_params = params
+        return self._stdp_plus, self._stdp_minus
+    
+    def _float_weights(self):
+        """Get the synaptic weights as float32 values, undoing any quantization."""
+        return (self.weights * np.float32(self.weight_scale)).astype(np.float32)
+    
+    def _max_weight(self):
+        """Get the largest weight STDP can reach, in the units of self.weights."""
+        return float(QUANTIZED_WEIGHT_STEPS) if self.quantize else 1.0
+    
+    def _decay(self, time_step):
+        """Get the membrane decay factor beta = exp(-time_step / tau) over one time step."""
+        if time_step != self._beta_time_step:
+            self._beta = np.float32(math.exp(-time_step / self.membrane_time_constant))
+            self._beta_time_step = time_step
+        return self._beta
+    
+    def _update_arrays(self, current, time_step):
+        """NumPy update of every NPU, used when Numba is unavailable; returns the spike mask."""
+        # Idle NPUs wake up when they receive input
+        awake = self._awake
+        awake |= current != 0
+        
+        # With few NPUs awake, update only those
+        awake_indices = np.flatnonzero(awake)
+        if len(awake_indices) < SPARSE_UPDATE_FRACTION * self.size:
+            V, timer, state = self.V[awake_indices], self.refractory[awake_indices], self.state[awake_indices]
+            spiked = self._fired
+            spiked.fill(False)
+            spiked[awake_indices] = self._integrate(V, timer, state, current[awake_indices], time_step)
+            self.V[awake_indices] = V
+            self.refractory[awake_indices] = timer
+            self.state[awake_indices] = state
+            awake[awake_indices] = (state != _RESTING) | (V != self.resting_potential)
+            return spiked
+        
+        spiked = self._integrate(self.V, self.refractory, self.state, current, time_step)
+        np.not_equal(self.V, self.resting_potential, out=awake)
+        awake |= self.state != _RESTING
+        return spiked
+    
+    def _integrate(self, V, timer, state, current, time_step):
+        """
+        Advance NPUs by one time step, updating their arrays in place.
+        
+        Args:
+            V: Membrane potentials
+            timer: Refractory time remaining
+            state: NPUState values
+            current: Input current of each NPU
+            time_step: Duration of time step (ms)
+            
+        Returns:
+            Boolean array marking the NPUs that fired
+        """
+        # Handle refractory period; NPUs whose period runs out integrate again
+        np.subtract(timer, time_step, out=timer, where=state == _REFRACTORY)
+        np.maximum(timer, 0.0, out=timer)
+        active = timer <= 0
+        
+        # Leaky integration, masked so refractory NPUs hold their potential; the
+        # potential decays exactly towards the resting potential
+        np.copyto(V, self.resting_potential + (V - self.resting_potential) * self._decay(time_step) + current,
+                  where=active)
+        
+        # Threshold crossing: spiking NPUs reset and enter the refractory period
+        spiked = active & (V >= self.threshold)
+        np.copyto(V, self.reset_potential, where=spiked)
+        np.copyto(timer, self.refractory_period, where=spiked)
+        
+        # Spiking and still refractory NPUs are refractory; the others integrate
+        # if they received input, and rest otherwise
+        state[:] = np.select([spiked | ~active, current > 0], [_REFRACTORY, _INTEGRATION], _RESTING)
+        return spiked
@@ -0,0 +1,14 @@
+# Optional SciPy sparse matrix support
+
+"""
+SciPy is an optional dependency of NeuronOS. When it is installed, spike
+delivery through large CSR synapse arrays runs as a compiled sparse
+matrix-vector product; otherwise callers take their NumPy code path.
+"""
+
+try:
+    import scipy.sparse as scipy_sparse
+    SCIPY_AVAILABLE = True
+except ImportError:
+    scipy_sparse = None
+    SCIPY_AVAILABLE = False
@@ -0,0 +1,33 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'code'))
+
+import cpm
+from cpm import CorticalProcessingModule, CPMType
+
+
+@pytest.mark.parametrize('numba', [True, False])
+@pytest.mark.parametrize('cpm_type', [CPMType.SENSORY, CPMType.MEMORY])
+def test_process_batch_matches_process_input(monkeypatch, numba, cpm_type):
+    """process_batch equals per-step process_input, with input and output layers larger than hidden."""
+    if numba and not cpm.NUMBA_AVAILABLE:
+        pytest.skip("Numba is not installed")
+    monkeypatch.setattr(cpm, 'NUMBA_AVAILABLE', numba)
+
+    batch = CorticalProcessingModule('c', cpm_type, 100, 10, 50, seed=3)
+    stepped = CorticalProcessingModule('c', cpm_type, 100, 10, 50, seed=3)
+    counts = (np.random.default_rng(0).random((40, 100)) < 0.9) * 30
+
+    fired_batch = batch.process_batch(counts, 0.0, 1.0)
+    fired_stepped = np.zeros_like(fired_batch)
+    for t, row in enumerate(counts):
+        spikes = [(i, float(t)) for i in np.flatnonzero(row) for _ in range(row[i])]
+        for output_index, _ in stepped.process_input(spikes, float(t), 1.0):
+            fired_stepped[t, output_index] = True
+
+    np.testing.assert_array_equal(fired_batch, fired_stepped)
+    assert list(batch.activity_history) == list(stepped.activity_history)
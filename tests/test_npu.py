@@ -0,0 +1,161 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'code'))
+
+import npu
+from npu import NeuralPopulation, NeuralProcessingUnit
+
+requires_numba = pytest.mark.skipif(not npu.NUMBA_AVAILABLE, reason="Numba is not installed")
+
+
+def random_connectivity(size, fan_out, seed=1):
+    """CSR connectivity with fan_out random targets (no self-synapses) per NPU."""
+    rng = np.random.default_rng(seed)
+    indptr = np.arange(size + 1, dtype=np.int32) * fan_out
+    indices = (np.arange(size).repeat(fan_out) + rng.integers(1, size, size * fan_out)) % size
+    weights = rng.random(size * fan_out).astype(np.float32)
+    return indptr, indices, weights
+
+
+def run_population(size=300, steps=400, quantize=False, max_delay=2, specialize=False, input_rate=0.05):
+    """Drive a recurrent population with random input; returns (population, spike indices per step)."""
+    rng = np.random.default_rng(0)
+    population = NeuralPopulation(size, max_delay=max_delay, quantize=quantize)
+    if specialize:
+        population.compile(0.5)
+    indptr, indices, weights = random_connectivity(size, 15)
+    population.set_connectivity(indptr, indices, weights * 8)
+    spikes = []
+    for step in range(steps):
+        input_current = ((rng.random(size) < input_rate) * 12).astype(np.float32)
+        fired = population.update(step * 0.5, 0.5, input_current)
+        population.deliver(fired, 1 + step % max_delay)
+        spikes.append(fired.tolist())
+    return population, spikes
+
+
+@requires_numba
+@pytest.mark.parametrize('quantize', [False, True])
+def test_numba_matches_numpy(monkeypatch, quantize):
+    """The compiled update, delivery and STDP paths match the NumPy fallback."""
+    compiled, compiled_spikes = run_population(quantize=quantize)
+    monkeypatch.setattr(npu, 'NUMBA_AVAILABLE', False)
+    fallback, fallback_spikes = run_population(quantize=quantize)
+
+    assert sum(map(len, compiled_spikes)) > 0
+    assert compiled_spikes == fallback_spikes
+    np.testing.assert_allclose(compiled.V, fallback.V, atol=1e-4)
+    np.testing.assert_array_equal(compiled.state, fallback.state)
+    np.testing.assert_allclose(compiled.weights, fallback.weights, atol=1e-6)
+
+
+@requires_numba
+def test_specialized_kernel_matches_generic():
+    """A kernel made by compile() gives the same spikes as the generic kernel."""
+    generic, generic_spikes = run_population(steps=200)
+    specialized, specialized_spikes = run_population(steps=200, specialize=True)
+    assert specialized._compiled_step is not None
+
+    assert specialized_spikes == generic_spikes
+    np.testing.assert_allclose(specialized.V, generic.V, atol=1e-3)
+
+
+def test_sparse_update_matches_full_update(monkeypatch):
+    """Updating only awake NPUs gives exactly the result of updating all of them."""
+    monkeypatch.setattr(npu, 'NUMBA_AVAILABLE', False)
+    monkeypatch.setattr(npu, 'SPARSE_UPDATE_FRACTION', 0.0)
+    full, full_spikes = run_population(steps=200, input_rate=0.005)
+    monkeypatch.setattr(npu, 'SPARSE_UPDATE_FRACTION', 0.5)
+    sparse, sparse_spikes = run_population(steps=200, input_rate=0.005)
+
+    assert sum(map(len, full_spikes)) > 0
+    assert sparse_spikes == full_spikes
+    np.testing.assert_array_equal(sparse.V, full.V)
+    np.testing.assert_array_equal(sparse.refractory, full.refractory)
+    np.testing.assert_array_equal(sparse.state, full.state)
+
+
+@pytest.mark.parametrize('quantize', [False, True])
+def test_scipy_delivery_matches_bincount(quantize):
+    """Dense delivery through the SciPy matrix matches the bincount path."""
+    population = NeuralPopulation(500, quantize=quantize)
+    population.set_connectivity(*random_connectivity(500, 20))
+    if population._matrix is None:
+        pytest.skip("SciPy is not installed")
+    spiking = np.flatnonzero(np.random.default_rng(2).random(500) < 0.5)
+
+    with_scipy = population.propagate(spiking)
+    population._matrix = None
+    with_bincount = population.propagate(spiking)
+
+    assert with_scipy.dtype == np.float32
+    np.testing.assert_allclose(with_scipy, with_bincount, atol=1e-5)
+
+
+def test_finalize_synapses_groups_by_source():
+    """Buffered synapses are merged by source NPU, after existing synapses of that NPU."""
+    population = NeuralPopulation(5)
+    population.set_connectivity([0, 1, 1, 2, 2, 2], [2, 3], [0.3, 0.4])
+    population.add_synapse(4, 0, 0.9)
+    population.add_synapse(0, 1, 0.5)
+    population.add_synapse(2, 0, 1.0)
+    population.finalize_synapses()
+
+    np.testing.assert_array_equal(population.indptr, [0, 2, 2, 4, 4, 5])
+    np.testing.assert_array_equal(population.indices, [2, 1, 3, 0, 0])
+    np.testing.assert_allclose(population.weights, [0.3, 0.5, 0.4, 1.0, 0.9])
+    np.testing.assert_allclose(population.propagate([0, 2, 4]), [1.9, 0.5, 0.3, 0.4, 0.0], atol=1e-6)
+
+
+@pytest.mark.parametrize('numba', [True, False])
+def test_population_stdp_window_and_parameters(monkeypatch, numba):
+    """STDP uses the current parameters and leaves pairs a whole window apart unchanged."""
+    if numba and not npu.NUMBA_AVAILABLE:
+        pytest.skip("Numba is not installed")
+    monkeypatch.setattr(npu, 'NUMBA_AVAILABLE', numba)
+
+    def pair(delta_t, a_minus=0.12):
+        population = NeuralPopulation(2)
+        population.set_connectivity([0, 1, 2], [1, 0], [0.5, 0.5])
+        population.stdp_a_minus = a_minus
+        population.last_spike_time[:] = [0.0, -np.inf]
+        population._apply_stdp(np.array([1]), delta_t)
+        return population.weights
+
+    assert pair(19.5)[0] > 0.5 and pair(19.5)[1] < 0.5
+    np.testing.assert_array_equal(pair(20.0), [0.5, 0.5])
+    assert pair(5.0, a_minus=0.0)[1] == 0.5
+
+
+def test_npu_stdp_window_and_parameters():
+    """NPU STDP uses the current parameters and leaves pairs a whole window apart unchanged."""
+    def pair(delta_t, a_minus=0.12):
+        unit = NeuralProcessingUnit(0)
+        unit.add_synapse(1, 0.5)
+        unit.stdp_a_minus = a_minus
+        unit.spike_history.append(0.0)
+        unit._apply_stdp(1, delta_t)
+        return unit.synapses[1]
+
+    assert pair(19.5) < 0.5
+    assert pair(20.0) == 0.5
+    assert pair(5.0, a_minus=0.0) == 0.5
+
+
+def test_npu_update_returns_target_array():
+    """update returns the synapse keys when the NPU fires, and an empty array of the same dtype otherwise."""
+    unit = NeuralProcessingUnit(0)
+    unit.add_synapse('a')
+    unit.add_synapse(5)
+    assert unit.update(0.0, 0.5).dtype == object
+    assert len(unit.update(0.0, 0.5)) == 0
+
+    for _ in range(30):
+        unit.receive_spike(1, 1.0)
+    targets = unit.update(1.0, 0.5)
+    assert targets.tolist() == ['a', 5]
+    assert targets.dtype == object and not targets.flags.writeable